@@ -1,9 +1,13 @@
 from django.contrib import admin
-from .models import Business, BusinessItem, Booking, Statistics, DailyStatistics, AnalyticsEvent
+from .models import Business, BusinessItem, Booking, BookingSlot, IdempotencyKey, Statistics, DailyStatistics, AnalyticsEvent, HourlyStatistics, UserAgent
 
 admin.site.register(Business)
 admin.site.register(BusinessItem)
 admin.site.register(Booking)
+admin.site.register(BookingSlot)
+admin.site.register(IdempotencyKey)
 admin.site.register(Statistics)
 admin.site.register(DailyStatistics)
-admin.site.register(AnalyticsEvent)
\ No newline at end of file
+admin.site.register(AnalyticsEvent)
+admin.site.register(HourlyStatistics)
+admin.site.register(UserAgent)
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BusinessesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'businesses'
+
+    def ready(self):
+        from businesses import signals  # noqa: F401
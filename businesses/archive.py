@@ -0,0 +1,183 @@
+# businesses/archive.py
+"""
+Cold storage for analytics events
+
+Old AnalyticsEvent rows are streamed out of the database into one
+gzip-compressed JSONL file per business per month:
+
+    <ANALYTICS_ARCHIVE_DIR>/<business_id>/<YYYY-MM>.jsonl.gz
+
+Each archive run appends a new gzip member, which gzip readers treat as
+one continuous stream. With pyarrow installed, the columnar format writes
+Parquet part files instead:
+
+    <ANALYTICS_ARCHIVE_DIR>/<business_id>/<YYYY-MM>/part-<first_id>.parquet
+
+A partition is chosen by the event's timestamp, not its id, so a later
+run can append lower ids to a partition (events buffered or settled out
+of order). If a run dies after writing but before deleting, the next run
+appends the same rows again. The reader skips any id it has already
+seen in the partition, whatever the order.
+"""
+import gzip
+import itertools
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import date as date_cls
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+ARCHIVE_FIELDS = (
+    'id', 'business_id', 'event_type', 'session_id', 'ip_address',
+    'user_agent', 'metadata', 'timestamp',
+)
+
+FORMATS = ('jsonl', 'parquet')
+
+
+def archive_root():
+    return Path(settings.ANALYTICS_ARCHIVE_DIR)
+
+
+def partition_name(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def write_events(rows, fmt='jsonl'):
+    """
+    Append event rows (dicts with ARCHIVE_FIELDS, in id order) to their
+    business/month partitions
+
+    Returns:
+        number of rows written
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown archive format: {fmt}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise RuntimeError("The parquet archive format requires pyarrow")
+
+    partitions = defaultdict(list)
+    for row in rows:
+        ts = row['timestamp']
+        partitions[(row['business_id'], ts.year, ts.month)].append(row)
+
+    for (business_id, year, month), part_rows in partitions.items():
+        directory = archive_root() / str(business_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = partition_name(year, month)
+
+        if fmt == 'parquet':
+            _write_parquet(directory / name, part_rows)
+        else:
+            _write_jsonl(directory / f"{name}.jsonl.gz", part_rows)
+
+    return sum(len(part_rows) for part_rows in partitions.values())
+
+
+def _serialize(row):
+    record = dict(row)
+    record['timestamp'] = row['timestamp'].isoformat()
+    return record
+
+
+def _write_jsonl(path, rows):
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            for row in rows:
+                gz.write(json.dumps(_serialize(row), ensure_ascii=False).encode('utf-8'))
+                gz.write(b'\n')
+        # Make sure the rows are on disk before the caller deletes them
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def _write_parquet(directory, rows):
+    directory.mkdir(exist_ok=True)
+    records = [_serialize(row) for row in rows]
+    for record in records:
+        record['metadata'] = json.dumps(record['metadata'], ensure_ascii=False)
+
+    table = pyarrow.Table.from_pylist(records)
+    path = directory / f"part-{rows[0]['id']:012d}.parquet"
+    pyarrow.parquet.write_table(table, path, compression='zstd')
+
+
+def _months(start_date, end_date):
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def iter_archived_events(business, start_date, end_date):
+    """
+    Stream archived events of a business between two dates (inclusive)
+
+    Only the partitions overlapping the range are opened, and files are
+    read line by line (or batch by batch); memory is bounded by the ids of
+    one partition, kept to drop duplicates.
+    """
+    business_id = getattr(business, 'pk', business)
+    directory = archive_root() / str(business_id)
+
+    for year, month in _months(start_date, end_date):
+        name = partition_name(year, month)
+
+        sources = []
+        jsonl_path = directory / f"{name}.jsonl.gz"
+        if jsonl_path.exists():
+            sources.append(_read_jsonl(jsonl_path))
+        parquet_dir = directory / name
+        if parquet_dir.is_dir():
+            sources.append(_read_parquet(parquet_dir))
+
+        # Rows written twice by an interrupted run, in either source
+        seen = set()
+        for record in itertools.chain(*sources):
+            if record['id'] in seen:
+                continue
+            seen.add(record['id'])
+
+            day = date_cls.fromisoformat(record['timestamp'][:10])
+            if start_date <= day <= end_date:
+                yield record
+
+
+def _read_jsonl(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_parquet(directory):
+    if pyarrow is None:
+        raise RuntimeError(f"Reading {directory} requires pyarrow")
+
+    for path in sorted(directory.glob('part-*.parquet')):
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches():
+            for record in batch.to_pylist():
+                record['metadata'] = json.loads(record['metadata'] or '{}')
+                yield record
+
+
+def aggregate_archived(business, start_date, end_date):
+    """
+    Re-aggregate archived events into daily counts
+
+    Returns:
+        Counter of {(date, event_type): count}
+    """
+    counts = Counter()
+    for record in iter_archived_events(business, start_date, end_date):
+        day = date_cls.fromisoformat(record['timestamp'][:10])
+        counts[(day, record['event_type'])] += 1
+    return counts
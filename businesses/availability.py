@@ -0,0 +1,192 @@
+# businesses/availability.py
+"""
+Free slot computation for booking businesses
+
+The working day (BOOKING_DAY_START to BOOKING_DAY_END) is split into
+BOOKING_SLOT_MINUTES slots, and each day's occupancy is one integer
+bitmap: bit i set means slot i is taken. All bookings of the requested
+range are loaded with a single query (their length is the total
+duration of their services), so finding where a service of n slots fits
+is n-bit mask tests in memory.
+
+Businesses have a single resource (one calendar) for now.
+
+Appointments claim their slots as BookingSlot rows, whose unique
+constraint stops two concurrent requests from booking the same time:
+the second insert fails and the request gets SlotUnavailable.
+
+Usage:
+    slots = free_slots(business, service, start_date, end_date)
+    # {date(2025, 3, 3): [time(9, 0), time(9, 15), ...], ...}
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def day_slots():
+    """Number of slots in a working day"""
+    length = _minutes(settings.BOOKING_DAY_END) - _minutes(settings.BOOKING_DAY_START)
+    return max(0, length // settings.BOOKING_SLOT_MINUTES)
+
+
+def slot_index(t):
+    """Index of the slot a time falls in (may be outside the day)"""
+    return (_minutes(t) - _minutes(settings.BOOKING_DAY_START)) // settings.BOOKING_SLOT_MINUTES
+
+
+def slot_time(index):
+    minutes = _minutes(settings.BOOKING_DAY_START) + index * settings.BOOKING_SLOT_MINUTES
+    return (datetime.min + timedelta(minutes=minutes)).time()
+
+
+def slots_needed(duration_minutes):
+    duration = duration_minutes or settings.BOOKING_SLOT_MINUTES
+    return -(-duration // settings.BOOKING_SLOT_MINUTES)
+
+
+def occupancy(business, start_date, end_date):
+    """
+    Occupancy bitmaps of the days between two dates (inclusive)
+
+    Returns:
+        {date: int}; days without bookings are missing (all free)
+    """
+    from businesses.models import Booking
+
+    bookings = (
+        Booking.objects.filter(
+            business=business,
+            booking_date__gte=start_date,
+            booking_date__lte=end_date,
+            booking_time__isnull=False,
+        )
+        .exclude(status='cancelled')
+        .order_by()
+        .values('id', 'booking_date', 'booking_time')
+        .annotate(duration=Sum('selected_items__duration_minutes'))
+    )
+
+    n_slots = day_slots()
+    days = {}
+    for booking in bookings:
+        minutes = _minutes(booking['booking_time']) - _minutes(settings.BOOKING_DAY_START)
+        first = minutes // settings.BOOKING_SLOT_MINUTES
+        # A booking starting mid-slot still takes the whole first slot
+        late = minutes % settings.BOOKING_SLOT_MINUTES
+        length = slots_needed((booking['duration'] or 0) + late)
+
+        # Clip to the working day
+        start, end = max(first, 0), min(first + length, n_slots)
+        if start >= end:
+            continue
+        mask = ((1 << (end - start)) - 1) << start
+        days[booking['booking_date']] = days.get(booking['booking_date'], 0) | mask
+    return days
+
+
+def free_slots(business, duration_minutes, start_date, end_date, now=None):
+    """
+    Start times where a service of `duration_minutes` fits, per day
+
+    Times already past (today) are left out.
+
+    Returns:
+        {date: [time, ...]} for every day in the range
+    """
+    now = timezone.localtime(now)
+    needed = slots_needed(duration_minutes)
+    n_slots = day_slots()
+    mask = (1 << needed) - 1
+    days = occupancy(business, start_date, end_date)
+
+    result = {}
+    day = start_date
+    while day <= end_date:
+        taken = days.get(day, 0)
+        first = 0
+        if day == now.date():
+            # The slot in progress has started already
+            first = max(0, slot_index(now.time()) + 1)
+        elif day < now.date():
+            first = n_slots
+
+        result[day] = [
+            slot_time(i)
+            for i in range(first, n_slots - needed + 1)
+            if not (taken >> i) & mask
+        ]
+        day += timedelta(days=1)
+    return result
+
+
+class SlotUnavailable(Exception):
+    """The booking overlaps a slot another booking already holds"""
+
+
+def slot_starts(booking_time, duration_minutes):
+    """
+    Start times of the grid slots a booking covers, within its day
+
+    The grid counts from midnight, so it lines up with the working-day
+    slots as long as BOOKING_DAY_START is on the grid.
+    """
+    step = settings.BOOKING_SLOT_MINUTES
+    minutes = _minutes(booking_time)
+    first = minutes - minutes % step
+    count = slots_needed((duration_minutes or 0) + minutes % step)
+    return [
+        (datetime.min + timedelta(minutes=start)).time()
+        for start in range(first, min(first + count * step, 24 * 60), step)
+    ]
+
+
+def claim_slots(booking, duration_minutes=None, resource=''):
+    """
+    Hold the slots of an appointment, in one insert
+
+    Must run inside the booking's transaction. Slots are inserted in time
+    order, so overlapping claims can't deadlock each other.
+
+    Raises:
+        SlotUnavailable
+    """
+    from businesses.models import BookingSlot
+
+    # Views and the admin may still hold the raw POSTed strings
+    booking_date = booking._meta.get_field('booking_date').to_python(booking.booking_date)
+    booking_time = booking._meta.get_field('booking_time').to_python(booking.booking_time)
+    if booking.booking_type != 'appointment' or booking_time is None:
+        return []
+
+    if duration_minutes is None:
+        duration_minutes = booking.selected_items.aggregate(
+            total=Sum('duration_minutes')
+        )['total']
+
+    slots = [
+        BookingSlot(
+            business_id=booking.business_id, booking=booking,
+            date=booking_date, time=start, resource=resource,
+        )
+        for start in slot_starts(booking_time, duration_minutes)
+    ]
+    try:
+        BookingSlot.objects.bulk_create(slots)
+    except IntegrityError as e:
+        raise SlotUnavailable from e
+    return slots
+
+
+def release_slots(booking):
+    """Free the slots held by a booking (cancelled or rescheduled)"""
+    from businesses.models import BookingSlot
+
+    BookingSlot.objects.filter(booking=booking).delete()
@@ -0,0 +1,272 @@
+# businesses/catalog.py
+"""
+Bulk import/export of BusinessItem catalogs
+
+Import reads CSV or XLSX row by row and upserts items by sku in batches:
+one SELECT for the batch's existing skus, then one bulk_create and one
+bulk_update. Invalid rows are reported with their line number and
+skipped; the rest of the file is still imported. Export streams rows
+straight from a server-side cursor. Neither side holds the whole
+catalog in memory.
+
+XLSX support needs openpyxl.
+
+Usage:
+    with open('catalog.csv', 'rb') as f:
+        result = import_catalog(business, read_rows(f, 'csv'))
+    result.created, result.updated, result.errors
+"""
+import csv
+import io
+import tempfile
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from businesses.versioning import bump_version
+
+try:
+    import openpyxl
+except ImportError:  # optional dependency
+    openpyxl = None
+
+# Column order of exported files; imports accept any subset that has
+# sku, name and price, in any order
+CATALOG_FIELDS = (
+    'sku', 'name', 'item_type', 'category', 'description', 'price',
+    'stock_quantity', 'duration_minutes', 'is_vegetarian', 'is_available',
+    'display_order', 'is_active',
+)
+REQUIRED_FIELDS = ('sku', 'name', 'price')
+FORMATS = ('csv', 'xlsx')
+
+# item_type for rows without one, by business type
+DEFAULT_ITEM_TYPES = {
+    'menu': 'menu_item',
+    'shop': 'product',
+    'booking': 'service',
+}
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+# Matched case-insensitively; covers the TRUE/FALSE that spreadsheet
+# apps write into CSV
+BOOLEAN_STRINGS = {
+    'true': True, 'yes': True, 'y': True, '1': True, 'так': True,
+    'false': False, 'no': False, 'n': False, '0': False, 'ні': False,
+}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    # (line, message), capped at MAX_REPORTED_ERRORS
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+        }
+
+
+def _require(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown catalog format: {fmt}")
+    if fmt == 'xlsx' and openpyxl is None:
+        raise RuntimeError("The xlsx catalog format requires openpyxl")
+
+
+def read_rows(fileobj, fmt='csv'):
+    """
+    Yield (line number, {column: value}) from a binary file object
+
+    Header names are matched case-insensitively.
+    """
+    _require(fmt)
+    if fmt == 'xlsx':
+        yield from _read_xlsx(fileobj)
+        return
+
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = [name.strip().lower() for name in next(reader, [])]
+        for values in reader:
+            if any(values):
+                # line_num counts physical lines, so quoted newlines don't skew it
+                yield reader.line_num, dict(zip(header, values))
+    finally:
+        # Leave the caller's file open
+        text.detach()
+
+
+def _read_xlsx(fileobj):
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(name or '').strip().lower() for name in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def clean_row(row):
+    """
+    Validate a raw row against the BusinessItem fields
+
+    Returns:
+        dict of cleaned values; blank optional columns are left out
+    Raises:
+        ValidationError
+    """
+    from businesses.models import BusinessItem
+
+    cleaned = {}
+    errors = []
+    for name in CATALOG_FIELDS:
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            if name in REQUIRED_FIELDS:
+                errors.append(f"{name}: required")
+            continue
+
+        model_field = BusinessItem._meta.get_field(name)
+        if model_field.get_internal_type() == 'BooleanField' and isinstance(value, str):
+            if value.lower() not in BOOLEAN_STRINGS:
+                errors.append(f"{name}: not a yes/no value")
+                continue
+            value = BOOLEAN_STRINGS[value.lower()]
+        try:
+            cleaned[name] = model_field.clean(value, None)
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def import_catalog(business, rows, default_item_type='product', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Upsert (line, row) pairs into the business's catalog by sku
+
+    Each batch is written in its own transaction, so a failure part-way
+    keeps the batches already imported.
+
+    Returns:
+        ImportResult
+    """
+    result = ImportResult()
+    batch = {}
+
+    for line, row in rows:
+        try:
+            values = clean_row(row)
+        except ValidationError as e:
+            result.add_error(line, '; '.join(e.messages))
+            continue
+
+        # A sku repeated within a batch: the last row wins
+        batch[values['sku']] = (line, values)
+        if len(batch) >= batch_size:
+            _write_batch(business, batch, default_item_type, result)
+            batch = {}
+
+    if batch:
+        _write_batch(business, batch, default_item_type, result)
+
+    # bulk_create/bulk_update send no signals
+    bump_version('dashboard', business)
+    bump_version('site', business)
+    return result
+
+
+def _write_batch(business, batch, default_item_type, result):
+    from businesses.models import BusinessItem
+
+    with transaction.atomic():
+        existing = {
+            item.sku: item
+            for item in BusinessItem.objects.filter(business=business, sku__in=batch.keys())
+        }
+
+        to_create, to_update = [], []
+        update_fields = set()
+        for sku, (line, values) in batch.items():
+            item = existing.get(sku)
+            if item is None:
+                values.setdefault('item_type', default_item_type)
+                to_create.append(BusinessItem(business=business, **values))
+            else:
+                for name, value in values.items():
+                    setattr(item, name, value)
+                update_fields.update(values)
+                to_update.append(item)
+
+        BusinessItem.objects.bulk_create(to_create)
+        if to_update:
+            BusinessItem.objects.bulk_update(to_update, sorted(update_fields - {'sku'}))
+
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+
+def _catalog_rows(business, chunk_size=2000):
+    from businesses.models import BusinessItem
+
+    return (
+        BusinessItem.objects.filter(business=business)
+        .order_by('display_order', 'name', 'id')
+        .values_list(*CATALOG_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def iter_catalog_csv(business):
+    """Yield the business's catalog as CSV lines, header first"""
+    writer = csv.writer(_Echo())
+    # BOM so spreadsheet apps open the Cyrillic text correctly
+    yield '\ufeff' + writer.writerow(CATALOG_FIELDS)
+    for values in _catalog_rows(business):
+        yield writer.writerow(values)
+
+
+def write_catalog_xlsx(business):
+    """
+    Write the catalog to a temporary XLSX file (rows are streamed to
+    disk by the write-only workbook) and return it, rewound
+    """
+    _require('xlsx')
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Catalog')
+    sheet.append(CATALOG_FIELDS)
+    for values in _catalog_rows(business):
+        sheet.append(values)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
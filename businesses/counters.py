@@ -0,0 +1,157 @@
+# businesses/counters.py
+"""
+Daily counter engine
+
+All writes to DailyStatistics go through incr()/incr_many(), which apply
+the deltas with a single UPDATE ... SET field = field + n and only fall
+back to an INSERT when the row for that day does not exist yet. Nothing
+is read back into Python, so concurrent workers never lose updates.
+Gauges such as unique_visitors are set with assign() the same way.
+All-time totals are summed from these rows when they are read (see
+utils.calculate_total_stats), so a hit writes exactly one row.
+
+Very hot businesses can be spread over several shard rows per day
+(settings.DAILY_STATS_HOT_SHARDS = {business_id: shards}); readers always
+Sum() over the day, so shards are transparent to them.
+"""
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from businesses.pubsub import publish
+from businesses.versioning import bump_version
+
+# DailyStatistics fields that may be incremented
+COUNTER_FIELDS = (
+    'visits',
+    'qr_scans',
+    'menu_views',
+    'bot_hits',
+    'orders',
+    'bookings',
+    'revenue',
+    'appointments',
+    'new_customers',
+    'returning_customers',
+)
+
+# DailyStatistics fields that are set to a value rather than incremented
+GAUGE_FIELDS = (
+    'unique_visitors',
+)
+
+# Statistics all-time totals and the daily counters they are summed from
+TOTAL_FIELDS = {
+    'visits': 'total_visits',
+    'qr_scans': 'qr_scans',
+    'menu_views': 'menu_views',
+    'orders': 'total_orders',
+    'bookings': 'total_bookings',
+    'revenue': 'total_revenue',
+    'new_customers': 'total_customers',
+}
+
+# Which counter an analytics event type feeds. Bookings and their revenue
+# are counted by the Booking post_save signal, not by their 'booking' event
+EVENT_COUNTER_FIELDS = {
+    'visit': 'visits',
+    'qr_scan': 'qr_scans',
+    'menu_view': 'menu_views',
+    'order': 'orders',
+}
+
+
+def incr(business, date, field, n=1):
+    """
+    Add `n` to one counter of the business's DailyStatistics for `date`
+
+    Usage:
+        incr(business, today, 'visits')
+        incr(business, today, 'revenue', booking.total_amount)
+    """
+    incr_many(business, date, {field: n})
+
+
+def incr_many(business, date, deltas):
+    """Apply several counter deltas for one business and day in one statement"""
+    from businesses.models import DailyStatistics
+
+    deltas = {field: n for field, n in deltas.items() if n}
+    if not deltas:
+        return
+
+    for field in deltas:
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown counter field: {field}")
+
+    business_id = getattr(business, 'pk', business)
+    date = date or timezone.now().date()
+    shard = _pick_shard(business_id, date, deltas)
+
+    rows = DailyStatistics.objects.filter(business_id=business_id, date=date, shard=shard)
+    updates = {field: F(field) + n for field, n in deltas.items()}
+    updates['updated_at'] = timezone.now()
+
+    _upsert(
+        rows, updates,
+        lambda: DailyStatistics(business_id=business_id, date=date, shard=shard, **deltas),
+    )
+    bump_version('dashboard', business_id)
+    publish(business_id, 'counters', {'date': date, 'deltas': deltas})
+
+
+def _upsert(rows, updates, new_row):
+    """UPDATE `rows`; if there are none yet, INSERT `new_row()` instead"""
+    if rows.update(**updates):
+        return
+
+    try:
+        with transaction.atomic():
+            new_row().save(force_insert=True)
+    except IntegrityError:
+        # Another worker created the row in the meantime. If there is still
+        # no row, the insert itself was invalid (e.g. a negative counter)
+        if not rows.update(**updates):
+            raise
+
+
+def assign(business, date, field, value):
+    """Set a gauge field (e.g. unique_visitors) on the day's first shard row"""
+    from businesses.models import DailyStatistics
+
+    if field not in GAUGE_FIELDS:
+        raise ValueError(f"Unknown gauge field: {field}")
+
+    business_id = getattr(business, 'pk', business)
+    _upsert(
+        DailyStatistics.objects.filter(business_id=business_id, date=date, shard=0),
+        {field: value, 'updated_at': timezone.now()},
+        lambda: DailyStatistics(business_id=business_id, date=date, shard=0, **{field: value}),
+    )
+    bump_version('dashboard', business_id)
+    publish(business_id, 'gauges', {'date': date, 'values': {field: value}})
+
+
+def shard_count(business_id):
+    hot = getattr(settings, 'DAILY_STATS_HOT_SHARDS', {})
+    return max(1, hot.get(business_id, 1))
+
+
+def _pick_shard(business_id, date, deltas):
+    shards = shard_count(business_id)
+    if shards == 1:
+        return 0
+
+    negative = [field for field, n in deltas.items() if n < 0]
+    if not negative:
+        return random.randrange(shards)
+
+    # Decrements must land on a shard that can absorb them
+    from businesses.models import DailyStatistics
+    row = DailyStatistics.objects.filter(
+        business_id=business_id, date=date
+    ).order_by(F(negative[0]).desc()).values_list('shard', flat=True).first()
+    return row or 0
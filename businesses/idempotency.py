@@ -0,0 +1,113 @@
+# businesses/idempotency.py
+"""
+Idempotency keys for booking submissions
+
+Clients send an Idempotency-Key header with a value generated once per
+submission (e.g. a UUID) and reused on every retry of it. The response
+of the first request is stored in an IdempotencyKey row written in the
+same transaction as the booking, so the key exists exactly when the
+booking does. A retry is answered from that row and writes nothing.
+
+Two concurrent requests with the same key both insert the row; the
+unique constraint lets only one commit, and the other replays its
+response.
+
+Keys are remembered for IDEMPOTENCY_KEY_TTL seconds. Expired rows are
+purged lazily, per business, whenever a new key is stored.
+
+Usage:
+    key = get_key(request)
+    record = find_key(business, key)
+    if record:
+        return replay(record, request_hash(request))
+    with transaction.atomic():
+        booking.save()
+        store_key(business, key, request_hash(request), booking, body)  # raises DuplicateRequest
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils import timezone
+
+HEADER = 'Idempotency-Key'
+
+
+class InvalidKey(Exception):
+    """The Idempotency-Key header is too long"""
+
+
+class DuplicateRequest(Exception):
+    """Another request with the same key has been committed first"""
+
+
+def get_key(request):
+    """
+    The request's idempotency key, or None if it has none
+
+    Raises:
+        InvalidKey
+    """
+    from businesses.models import IdempotencyKey
+
+    key = request.headers.get(HEADER, '').strip()
+    if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        raise InvalidKey
+    return key or None
+
+
+def request_hash(request):
+    """Fingerprint of the submitted form, independent of field order"""
+    payload = json.dumps(sorted(request.POST.lists()), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cutoff():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def find_key(business, key):
+    """The stored, unexpired record of a key, or None"""
+    from businesses.models import IdempotencyKey
+
+    return IdempotencyKey.objects.filter(
+        business=business, key=key, created_at__gte=_cutoff(),
+    ).first()
+
+
+def store_key(business, key, fingerprint, booking, body, status=200):
+    """
+    Record the response of a request under its key
+
+    Must run inside the transaction that writes the booking, so both
+    commit or neither does.
+
+    Raises:
+        DuplicateRequest
+    """
+    from businesses.models import IdempotencyKey
+
+    # Also frees this key if it expired but is still stored
+    IdempotencyKey.objects.filter(business=business, created_at__lt=_cutoff()).delete()
+    try:
+        return IdempotencyKey.objects.create(
+            business=business, key=key, request_hash=fingerprint,
+            booking=booking, response_status=status, response_body=body,
+        )
+    except IntegrityError as e:
+        raise DuplicateRequest from e
+
+
+def replay(record, fingerprint):
+    """The stored response, or a 422 if the key came with another request"""
+    if record.request_hash != fingerprint:
+        return JsonResponse(
+            {'error': 'Idempotency key was already used for a different request'},
+            status=422,
+        )
+    response = JsonResponse(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
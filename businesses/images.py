@@ -0,0 +1,238 @@
+# businesses/images.py
+"""
+Responsive image variants for uploaded item images, logos and covers
+
+After an upload is saved, the image is decoded once with Pillow,
+auto-rotated, stripped of metadata and re-encoded as WebP and JPEG at
+each of IMAGE_VARIANT_WIDTHS (never upscaled). Variants are stored under
+the hash of their content, so their URLs never change meaning and can be
+served with a far-future Cache-Control. The result is kept in the
+model's <field>_variants JSON field:
+
+    {
+        "source": "business_items/photo.jpg",
+        "width": 4032, "height": 3024,
+        "variants": [
+            {"width": 320, "height": 240, "format": "webp", "name": "variants/3f9c...-320w.webp"},
+            ...
+        ]
+    }
+
+Processing runs after the transaction commits, on a small background
+thread pool (or inline with IMAGE_PROCESSING_ASYNC off), never on the
+request that uploaded the file. Variants of a replaced or removed upload
+are deleted, unless another image has identical ones.
+"""
+import atexit
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q, TextField
+from django.db.models.functions import Cast
+from PIL import ExifTags, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Image fields that get variants: {model label: (field, ...)}
+IMAGE_FIELDS = {
+    'businesses.Business': ('logo', 'cover_image'),
+    'businesses.BusinessItem': ('image',),
+}
+
+# EXIF orientations that turn the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+CONTENT_TYPES = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def variants_field(field_name):
+    return f"{field_name}_variants"
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode == 'RGBA':
+        # JPEG has no alpha: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    output = io.BytesIO()
+    # No exif/icc arguments: the variants carry no metadata
+    image.save(output, **FORMATS[fmt])
+    return output.getvalue()
+
+
+def generate_variants(field_file, widths=None):
+    """
+    Render and store the variants of one image file
+
+    Returns:
+        variants metadata dict (see module docstring)
+    """
+    widths = sorted(widths or settings.IMAGE_VARIANT_WIDTHS, reverse=True)
+    storage = field_file.storage
+
+    with field_file.open('rb') as f:
+        image = Image.open(f)
+        # Size as uploaded (upright), before draft() shrinks the decode
+        original_width, original_height = image.size
+        if image.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+            original_width, original_height = original_height, original_width
+        # Let the JPEG decoder downscale while decoding huge photos
+        image.draft('RGB', (widths[0], widths[0]))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    # Never upscale: an image narrower than the largest width is kept at
+    # its own width as the largest variant
+    targets = [width for width in widths if width < original_width]
+    if original_width <= widths[0]:
+        targets.insert(0, original_width)
+
+    variants = []
+    current = image
+    for width in targets:
+        height = max(1, round(original_height * width / original_width))
+        # Widths are descending, so each step resizes the previous one
+        if current.width != width:
+            current = current.resize((width, height), Image.Resampling.LANCZOS)
+
+        for fmt in FORMATS:
+            data = _encode(current, fmt)
+            digest = hashlib.sha256(data).hexdigest()[:24]
+            name = f"{settings.IMAGE_VARIANTS_DIR}/{digest}-{width}w.{fmt}"
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(data))
+            variants.append({'width': width, 'height': height, 'format': fmt, 'name': name})
+
+    return {
+        'source': field_file.name,
+        'width': original_width,
+        'height': original_height,
+        'variants': variants,
+    }
+
+
+def process_image(model_label, pk, field_name, force=False):
+    """Generate variants for one instance's image field, if still needed"""
+    from businesses.versioning import bump_version
+
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    field_file = getattr(instance, field_name)
+    meta_field = variants_field(field_name)
+    if not field_file:
+        return
+    if not force and getattr(instance, meta_field).get('source') == field_file.name:
+        return
+
+    previous = getattr(instance, meta_field)
+    try:
+        metadata = generate_variants(field_file)
+    except (OSError, Image.DecompressionBombError):
+        logger.exception("Could not process %s %s of %s %s", field_name, field_file.name, model_label, pk)
+        metadata = {'source': field_file.name, 'error': True, 'variants': []}
+
+    # Only store it if the upload wasn't replaced in the meantime;
+    # update() keeps post_save (and another round of processing) out of it
+    stored = model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**{meta_field: metadata})
+    # Drop the variants nothing points at any more: the replaced upload's,
+    # or our own if the upload was replaced while we worked
+    delete_variants(field_file.storage, previous if stored else metadata)
+
+    business_id = pk if model_label == 'businesses.Business' else instance.business_id
+    bump_version('site', business_id)
+
+
+def delete_variants(storage, metadata):
+    """Delete the files of a variants dict that no stored variants reference"""
+    names = {variant['name'] for variant in (metadata or {}).get('variants', [])}
+    if not names:
+        return
+
+    # Identical images share their content-addressed variant files
+    for model_label, field_names in IMAGE_FIELDS.items():
+        model = apps.get_model(model_label)
+        for field_name in field_names:
+            texts = (
+                model.objects.annotate(text=Cast(variants_field(field_name), TextField()))
+                .filter(reduce(or_, (Q(text__contains=name) for name in names)))
+                .values_list('text', flat=True)
+            )
+            for text in texts:
+                names = {name for name in names if name not in text}
+            if not names:
+                return
+
+    for name in names:
+        storage.delete(name)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='image-variants',
+            )
+            atexit.register(_executor.shutdown)
+        return _executor
+
+
+def _run(model_label, pk, field_name):
+    try:
+        process_image(model_label, pk, field_name)
+    except Exception:
+        logger.exception("Image processing failed for %s %s", model_label, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(instance, field_name):
+    """Process an image field once the current transaction has committed"""
+    model_label = instance._meta.label
+    pk = instance.pk
+
+    def submit():
+        if settings.IMAGE_PROCESSING_ASYNC:
+            _get_executor().submit(_run, model_label, pk, field_name)
+        else:
+            process_image(model_label, pk, field_name)
+
+    transaction.on_commit(submit)
+
+
+def variants_for(instance, field_name, fmt=None):
+    """Stored variants of an image field, smallest first"""
+    metadata = getattr(instance, variants_field(field_name), None) or {}
+    variants = [v for v in metadata.get('variants', []) if fmt is None or v['format'] == fmt]
+    return sorted(variants, key=lambda v: v['width'])
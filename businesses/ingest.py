@@ -0,0 +1,197 @@
+# businesses/ingest.py
+import atexit
+import logging
+import queue
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """
+    In-process queue for analytics events
+
+    Events are written with bulk_create once `batch_size` of them are
+    waiting or `flush_interval` seconds have passed, whichever comes first.
+    Daily counters are folded into one increment per
+    (business, date, event_type) per flush.
+
+    A batch is written in one transaction. If that fails, the batch is
+    kept and written first by the next flush; if it fails again it is
+    dropped and logged, so one bad event can't block the queue.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=2.0, max_size=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._bot_hits = Counter()
+        self._failed = []
+        self._bot_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background flusher thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='analytics-flusher', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """Stop the flusher and write out everything still queued"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception(
+                'Failed to flush analytics events on shutdown; %d left unwritten',
+                self.pending() + len(self._failed),
+            )
+
+    def add(self, event):
+        """Queue an unsaved AnalyticsEvent"""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Never block a page render on analytics - write inline instead
+            self.flush()
+            self._queue.put_nowait(event)
+
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def add_bot_hit(self, business_id):
+        """Count a bot page hit; written as one increment per business per flush"""
+        with self._bot_lock:
+            self._bot_hits[(business_id, timezone.now().date())] += 1
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Write all queued events; returns the number of events written"""
+        written = 0
+        with self._flush_lock:
+            self._write_bot_hits()
+            while True:
+                batch, retrying = self._failed, True
+                self._failed = []
+                if not batch:
+                    batch, retrying = self._drain(self.batch_size), False
+                if not batch:
+                    break
+                try:
+                    self._write(batch)
+                except Exception:
+                    if retrying:
+                        logger.error('Dropped %d analytics events after a failed retry', len(batch))
+                    else:
+                        self._failed = batch
+                    raise
+                written += len(batch)
+        return written
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_bot_hits(self):
+        from businesses.counters import incr
+
+        with self._bot_lock:
+            bot_hits, self._bot_hits = self._bot_hits, Counter()
+        try:
+            with transaction.atomic():
+                for (business_id, date), amount in bot_hits.items():
+                    incr(business_id, date, 'bot_hits', amount)
+        except Exception:
+            # Only counts; not worth holding up the events for
+            logger.exception('Dropped %d bot hits', sum(bot_hits.values()))
+
+    def _write(self, batch):
+        from businesses.models import AnalyticsEvent
+        from businesses.counters import EVENT_COUNTER_FIELDS, incr
+        from businesses.visitors import record_visits, visitor_key
+
+        # All or nothing, so a failed batch can be written again as is
+        try:
+            with transaction.atomic():
+                AnalyticsEvent.objects.bulk_create(batch, batch_size=self.batch_size)
+
+                counts = Counter(
+                    (event.business_id, event.timestamp.date(), event.event_type)
+                    for event in batch
+                    if event.event_type in EVENT_COUNTER_FIELDS
+                )
+                for (business_id, date, event_type), amount in counts.items():
+                    incr(business_id, date, EVENT_COUNTER_FIELDS[event_type], amount)
+
+                record_visits(
+                    (
+                        event.business_id,
+                        event.timestamp.date(),
+                        visitor_key(event.session_id, event.ip_address, event.agent_id),
+                    )
+                    for event in batch
+                    if event.event_type == 'visit'
+                )
+        except Exception:
+            # Forget the ids of the rolled back rows
+            for event in batch:
+                event.pk = None
+                event._state.adding = True
+            raise
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush analytics events')
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_event_buffer():
+    """Return the process-wide event buffer, starting it on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = EventBuffer(
+                    batch_size=settings.ANALYTICS_BATCH_SIZE,
+                    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL,
+                )
+                _buffer.start()
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def is_buffered():
+    return getattr(settings, 'ANALYTICS_BUFFERED', False)
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from businesses.catalog import DEFAULT_BATCH_SIZE, DEFAULT_ITEM_TYPES, FORMATS, import_catalog, read_rows
+from businesses.models import Business
+
+
+class Command(BaseCommand):
+    help = "Import a CSV/XLSX catalog into a business, upserting items by sku"
+
+    def add_arguments(self, parser):
+        parser.add_argument('business_slug')
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help="File format (default: from the file extension)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Rows per batch (default: {DEFAULT_BATCH_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            business = Business.objects.get(slug=options['business_slug'])
+        except Business.DoesNotExist:
+            raise CommandError(f"Unknown business: {options['business_slug']}")
+
+        path = options['path']
+        fmt = options['format'] or ('xlsx' if path.lower().endswith('.xlsx') else 'csv')
+
+        started = time.monotonic()
+        with open(path, 'rb') as f:
+            try:
+                result = import_catalog(
+                    business, read_rows(f, fmt),
+                    default_item_type=DEFAULT_ITEM_TYPES.get(business.business_type, 'product'),
+                    batch_size=options['batch_size'],
+                )
+            except RuntimeError as e:
+                raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        for line, message in result.errors:
+            self.stderr.write(f"Line {line}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more errors")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.created}, updated {result.updated}, "
+            f"rejected {result.failed} rows in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from businesses.images import IMAGE_FIELDS, process_image, variants_field
+
+
+class Command(BaseCommand):
+    help = "Generate responsive variants for uploaded images that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Regenerate variants of every image (e.g. after changing IMAGE_VARIANT_WIDTHS)",
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        started = time.monotonic()
+        total = 0
+
+        for model_label, field_names in IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            for field_name in field_names:
+                rows = (
+                    model.objects.exclude(**{field_name: ''})
+                    .values_list('pk', field_name, variants_field(field_name))
+                    .iterator()
+                )
+                for pk, name, metadata in rows:
+                    if force or (metadata or {}).get('source') != name:
+                        process_image(model_label, pk, field_name, force=force)
+                        total += 1
+                        self.stdout.write(f"{model_label} {pk} {field_name}: {name}")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} images in {elapsed:.1f}s"))
@@ -0,0 +1,134 @@
+import time
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from businesses.counters import TOTAL_FIELDS
+from businesses.models import Booking, Business, DailyStatistics, Statistics
+
+# DailyStatistics counters derived from Booking rows
+BOOKING_FIELDS = ('bookings', 'revenue', 'appointments')
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the daily booking counters from Booking and snapshot the "
+        "all-time Statistics totals from DailyStatistics to repair drift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Businesses per batch (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        total = 0
+
+        last_id = 0
+        while True:
+            batch = list(
+                Business.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            total += self._rebuild(batch)
+            last_id = batch[-1]
+            self.stdout.write(f"Rebuilt {total} businesses")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt statistics for {total} businesses in {elapsed:.1f}s"
+        ))
+
+    def _rebuild(self, business_ids):
+        """Recompute one batch of businesses with one aggregate query per source"""
+        with transaction.atomic():
+            self._recount_bookings(business_ids)
+            return self._snapshot_totals(business_ids)
+
+    def _recount_bookings(self, business_ids):
+        """
+        Rewrite the batch's bookings/revenue/appointments counters from its
+        active bookings, the way signals.apply_booking_deltas counts them
+        """
+        counts = defaultdict(lambda: {'bookings': 0, 'revenue': Decimal(0), 'appointments': 0})
+        active = Booking.objects.filter(business_id__in=business_ids).exclude(status='cancelled').order_by()
+        made = (
+            active.annotate(day=TruncDate('created_at', tzinfo=dt_timezone.utc))
+            .values('business_id', 'day').annotate(n=Count('id'), amount=Sum('total_amount'))
+        )
+        for row in made:
+            counts[row['business_id'], row['day']].update(bookings=row['n'], revenue=row['amount'])
+        for row in active.values('business_id', 'booking_date').annotate(n=Count('id')):
+            counts[row['business_id'], row['booking_date']]['appointments'] = row['n']
+
+        # The UPDATE also locks the rows until the batch commits
+        rows = DailyStatistics.objects.filter(business_id__in=business_ids)
+        rows.update(**{field: 0 for field in BOOKING_FIELDS})
+        existing = {(row.business_id, row.date): row for row in rows.filter(shard=0)}
+
+        to_update, to_create = [], []
+        for (business_id, day), values in counts.items():
+            row = existing.get((business_id, day))
+            if row is None:
+                to_create.append(DailyStatistics(business_id=business_id, date=day, **values))
+            else:
+                for field, value in values.items():
+                    setattr(row, field, value)
+                to_update.append(row)
+
+        DailyStatistics.objects.bulk_update(to_update, BOOKING_FIELDS)
+        DailyStatistics.objects.bulk_create(to_create)
+
+    def _snapshot_totals(self, business_ids):
+        """Store the batch's all-time totals, summed from DailyStatistics"""
+        today = timezone.now().date()
+        week_end = today + timedelta(days=6)
+
+        sums = {total: Sum(counter, default=0) for counter, total in TOTAL_FIELDS.items()}
+        sums['appointments_today'] = Sum('appointments', filter=Q(date=today), default=0)
+        sums['appointments_week'] = Sum(
+            'appointments', filter=Q(date__gte=today, date__lte=week_end), default=0
+        )
+        rows = {
+            row.pop('business_id'): row
+            for row in DailyStatistics.objects.filter(business_id__in=business_ids)
+            .order_by().values('business_id').annotate(**sums)
+        }
+
+        fields = list(sums) + ['average_order_value']
+        existing = {
+            stats.business_id: stats
+            for stats in Statistics.objects.select_for_update().filter(business_id__in=business_ids)
+        }
+
+        to_update, to_create = [], []
+        for business_id in business_ids:
+            stats = existing.get(business_id)
+            if stats is None:
+                stats = Statistics(business_id=business_id)
+                to_create.append(stats)
+            else:
+                to_update.append(stats)
+
+            row = rows.get(business_id, {})
+            for field in sums:
+                setattr(stats, field, row.get(field, 0))
+            stats.average_order_value = (
+                round(stats.total_revenue / stats.total_orders, 2) if stats.total_orders else 0
+            )
+
+        Statistics.objects.bulk_update(to_update, fields)
+        Statistics.objects.bulk_create(to_create)
+
+        return len(business_ids)
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from businesses.archive import FORMATS
+from businesses.rollup import prune_chunk, rollup_chunk
+
+
+class Command(BaseCommand):
+    help = "Roll raw analytics events up into hourly statistics and visitor sketches, and prune old events"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Events per transaction (default: 5000)",
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=settings.ANALYTICS_RETENTION_DAYS,
+            help="Keep raw events for this many days (default: ANALYTICS_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            '--no-prune', action='store_true',
+            help="Only roll up, keep all raw events",
+        )
+        parser.add_argument(
+            '--archive', choices=FORMATS, nargs='?', const='jsonl',
+            help="Write pruned events to ANALYTICS_ARCHIVE_DIR first (jsonl or parquet)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        self._run("Rolled up", lambda: rollup_chunk(chunk_size))
+
+        if not options['no_prune']:
+            retention_days = options['retention_days']
+            archive_format = options['archive']
+            self._run(
+                "Archived and pruned" if archive_format else "Pruned",
+                lambda: prune_chunk(retention_days, chunk_size, archive_format),
+            )
+
+    def _run(self, label, step):
+        """Call `step` until it returns 0, reporting progress and throughput"""
+        total = 0
+        started = time.monotonic()
+
+        while True:
+            n = step()
+            if not n:
+                break
+            total += n
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{label} {total} events ({total / elapsed:,.0f} rows/s)")
+
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{label} {total} events in {elapsed:.1f}s ({rate:,.0f} rows/s)"
+        ))
+        return total
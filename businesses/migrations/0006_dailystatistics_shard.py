@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0005_analyticsevent_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailystatistics',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dailystatistics',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailystatistics',
+            unique_together={('business', 'date', 'shard')},
+        ),
+    ]
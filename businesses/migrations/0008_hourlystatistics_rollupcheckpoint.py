@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0007_visitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlyStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('event_type', models.CharField(choices=[('visit', 'Page Visit'), ('qr_scan', 'QR Code Scan'), ('menu_view', 'Menu View'), ('item_view', 'Item View'), ('booking', 'Booking Created'), ('order', 'Order Placed')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='businesses.business')),
+            ],
+            options={
+                'verbose_name_plural': 'Hourly statistics',
+                'ordering': ['-date', 'hour'],
+                'unique_together': {('business', 'date', 'hour', 'event_type')},
+            },
+        ),
+    ]
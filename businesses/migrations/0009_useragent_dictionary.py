@@ -0,0 +1,131 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:25
+
+import hashlib
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Left, Length
+
+BATCH_SIZE = 2000
+
+# Frozen copy of the classification in businesses/useragents.py, so this
+# migration keeps working whatever happens to that module later
+BOT_RE = re.compile(
+    r'bot\b|crawl|spider|slurp|preview|facebookexternalhit|whatsapp|curl/|wget/'
+    r'|python-requests|headlesschrome',
+    re.IGNORECASE,
+)
+TABLET_RE = re.compile(r'ipad|tablet|kindle|silk|(android(?!.*mobile))', re.IGNORECASE)
+MOBILE_RE = re.compile(r'mobi|iphone|ipod|android|windows phone', re.IGNORECASE)
+BROWSERS = (
+    ('Edge', re.compile(r'edg(e|a|ios)?/', re.IGNORECASE)),
+    ('Opera', re.compile(r'opr/|opera', re.IGNORECASE)),
+    ('Samsung Internet', re.compile(r'samsungbrowser', re.IGNORECASE)),
+    ('Firefox', re.compile(r'firefox|fxios', re.IGNORECASE)),
+    ('Chrome', re.compile(r'chrome|crios', re.IGNORECASE)),
+    ('Safari', re.compile(r'safari', re.IGNORECASE)),
+)
+OPERATING_SYSTEMS = (
+    ('iOS', re.compile(r'iphone|ipad|ipod', re.IGNORECASE)),
+    ('Android', re.compile(r'android', re.IGNORECASE)),
+    ('Windows', re.compile(r'windows', re.IGNORECASE)),
+    ('macOS', re.compile(r'mac os x|macintosh', re.IGNORECASE)),
+    ('Linux', re.compile(r'linux', re.IGNORECASE)),
+)
+
+
+def user_agent_hash(user_agent):
+    return hashlib.sha1(user_agent.encode('utf-8')).hexdigest()
+
+
+def parse_user_agent(user_agent):
+    bot = bool(BOT_RE.search(user_agent))
+    if bot:
+        device_type = 'bot'
+    elif TABLET_RE.search(user_agent):
+        device_type = 'tablet'
+    elif MOBILE_RE.search(user_agent):
+        device_type = 'mobile'
+    else:
+        device_type = 'desktop'
+
+    return {
+        'device_type': device_type,
+        'browser': next((name for name, pattern in BROWSERS if pattern.search(user_agent)), ''),
+        'os': next((name for name, pattern in OPERATING_SYSTEMS if pattern.search(user_agent)), ''),
+        'is_bot': bot,
+    }
+
+
+def move_user_agents(apps, schema_editor):
+    """Point existing events at UserAgent rows, one batch of events at a time"""
+    AnalyticsEvent = apps.get_model('businesses', 'AnalyticsEvent')
+    UserAgent = apps.get_model('businesses', 'UserAgent')
+
+    last_id = 0
+    while True:
+        batch = list(
+            AnalyticsEvent.objects.filter(id__gt=last_id)
+            .exclude(user_agent='')
+            .order_by('id')
+            .only('id', 'user_agent')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        hashes = {event.user_agent: user_agent_hash(event.user_agent) for event in batch}
+        known = dict(
+            UserAgent.objects.filter(ua_hash__in=set(hashes.values())).values_list('ua_hash', 'id')
+        )
+        UserAgent.objects.bulk_create([
+            UserAgent(ua_hash=ua_hash, user_agent=user_agent, **parse_user_agent(user_agent))
+            for user_agent, ua_hash in hashes.items()
+            if ua_hash not in known
+        ])
+        known = dict(
+            UserAgent.objects.filter(ua_hash__in=set(hashes.values())).values_list('ua_hash', 'id')
+        )
+
+        for event in batch:
+            event.agent_id = known[hashes[event.user_agent]]
+        AnalyticsEvent.objects.bulk_update(batch, ['agent'], batch_size=500)
+
+    # Django session keys are 32 characters; trim anything longer before
+    # the column shrinks
+    AnalyticsEvent.objects.annotate(length=Length('session_id')).filter(
+        length__gt=40
+    ).update(session_id=Left('session_id', 40))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0008_hourlystatistics_rollupcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ua_hash', models.CharField(max_length=40, unique=True)),
+                ('user_agent', models.TextField()),
+                ('device_type', models.CharField(choices=[('desktop', 'Desktop'), ('mobile', 'Mobile'), ('tablet', 'Tablet'), ('bot', 'Bot'), ('other', 'Other')], default='other', max_length=20)),
+                ('browser', models.CharField(blank=True, max_length=50)),
+                ('os', models.CharField(blank=True, max_length=50)),
+                ('is_bot', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='analyticsevent',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='businesses.useragent'),
+        ),
+        # Only data changes after this point: on PostgreSQL the table can't be
+        # altered again in the same transaction once rows were updated, so
+        # the column changes follow in 0010 and 0011
+        migrations.RunPython(move_user_agents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0009_useragent_dictionary'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='analyticsevent',
+            name='user_agent',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0010_remove_analyticsevent_user_agent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analyticsevent',
+            name='session_id',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0011_alter_analyticsevent_session_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystatistics',
+            name='bot_hits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
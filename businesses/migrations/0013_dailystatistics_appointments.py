@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:28
+
+from collections import defaultdict
+from datetime import timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_booking_counters(apps, schema_editor):
+    """
+    Recount bookings, revenue and appointments from the Booking rows
+
+    Until now revenue and appointments were never recorded and cancelled
+    bookings were never subtracted, while the Booking signals from here on
+    un-count a booking when it is cancelled. Each active booking counts on
+    the (UTC) day it was made, its appointment on the day it is scheduled
+    for, as in signals.apply_booking_deltas.
+    """
+    Booking = apps.get_model('businesses', 'Booking')
+    DailyStatistics = apps.get_model('businesses', 'DailyStatistics')
+
+    counts = defaultdict(lambda: {'bookings': 0, 'revenue': Decimal(0), 'appointments': 0})
+    active = Booking.objects.exclude(status='cancelled').order_by()
+    made = (
+        active.annotate(day=TruncDate('created_at', tzinfo=timezone.utc))
+        .values('business_id', 'day').annotate(n=Count('id'), amount=Sum('total_amount'))
+    )
+    for row in made:
+        counts[row['business_id'], row['day']].update(bookings=row['n'], revenue=row['amount'])
+    for row in active.values('business_id', 'booking_date').annotate(n=Count('id')):
+        counts[row['business_id'], row['booking_date']]['appointments'] = row['n']
+
+    DailyStatistics.objects.update(bookings=0, revenue=0, appointments=0)
+    existing = {
+        (row.business_id, row.date): row
+        for row in DailyStatistics.objects.filter(
+            shard=0, business_id__in={business_id for business_id, day in counts},
+        )
+    }
+    to_update, to_create = [], []
+    for (business_id, day), values in counts.items():
+        row = existing.get((business_id, day))
+        if row is None:
+            to_create.append(DailyStatistics(business_id=business_id, date=day, shard=0, **values))
+        else:
+            for field, value in values.items():
+                setattr(row, field, value)
+            to_update.append(row)
+
+    DailyStatistics.objects.bulk_update(to_update, ['bookings', 'revenue', 'appointments'], batch_size=500)
+    DailyStatistics.objects.bulk_create(to_create, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0012_dailystatistics_bot_hits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystatistics',
+            name='appointments',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_booking_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0013_dailystatistics_appointments'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='businessitem',
+            index=models.Index(fields=['business', 'is_active', 'display_order', 'name'], name='item_active_display_idx'),
+        ),
+    ]
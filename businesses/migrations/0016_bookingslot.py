@@ -0,0 +1,83 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:46
+
+from datetime import datetime, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+
+def slot_starts(booking_time, duration_minutes):
+    """Frozen copy of availability.slot_starts: grid slots a booking covers"""
+    # The grid has to match the one new bookings are checked against
+    step = settings.BOOKING_SLOT_MINUTES
+    minutes = booking_time.hour * 60 + booking_time.minute
+    first = minutes - minutes % step
+    length = (duration_minutes or 0) + minutes % step
+    count = -(-(length or step) // step)
+    return [
+        (datetime.min + timedelta(minutes=start)).time()
+        for start in range(first, min(first + count * step, 24 * 60), step)
+    ]
+
+
+def claim_existing_slots(apps, schema_editor):
+    """
+    Hold the slots of appointments that are still ahead, so new bookings
+    can't take them
+
+    Earlier bookings win where existing appointments already overlap.
+    """
+    Booking = apps.get_model('businesses', 'Booking')
+    BookingSlot = apps.get_model('businesses', 'BookingSlot')
+
+    bookings = (
+        Booking.objects.filter(
+            booking_type='appointment',
+            booking_date__gte=timezone.localdate(),
+            booking_time__isnull=False,
+        )
+        .exclude(status='cancelled')
+        .order_by('id')
+        .values('id', 'business_id', 'booking_date', 'booking_time')
+        .annotate(duration=Sum('selected_items__duration_minutes'))
+    )
+    slots = []
+    for booking in bookings.iterator():
+        slots.extend(
+            BookingSlot(
+                business_id=booking['business_id'], booking_id=booking['id'],
+                date=booking['booking_date'], time=start,
+            )
+            for start in slot_starts(booking['booking_time'], booking['duration'])
+        )
+    BookingSlot.objects.bulk_create(slots, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('businesses', '0015_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('resource', models.CharField(blank=True, default='', max_length=50)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='businesses.booking')),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_slots', to='businesses.business')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business', 'date', 'time', 'resource'), name='unique_booking_slot')],
+            },
+        ),
+        migrations.RunPython(claim_existing_slots, migrations.RunPython.noop),
+    ]
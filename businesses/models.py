@@ -1,9 +1,7 @@
 # businesses/models.py
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
-from django.utils.text import slugify
 from django.utils import timezone
-from datetime import timedelta
 
 class Business(models.Model):
     """Main business model - handles all business types"""
@@ -27,19 +25,29 @@ class Business(models.Model):
     primary_color = models.CharField(max_length=7, default='#007bff')
     logo = models.ImageField(upload_to='business_logos/', blank=True)
     cover_image = models.ImageField(upload_to='business_covers/', blank=True)
+    # Responsive variants, filled in by businesses.images
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-            while Business.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        
+        from businesses.provisioning import MAX_RETRIES, allocate_slugs
+        
+        # One query finds a free slug; a concurrent signup taking it first
+        # trips the unique constraint and we allocate again
+        for attempt in range(MAX_RETRIES):
+            self.slug = allocate_slugs([self.name])[0]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.slug = ''
+                if attempt == MAX_RETRIES - 1:
+                    raise
     
     def __str__(self):
         return self.name
@@ -60,6 +68,7 @@ class BusinessItem(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='business_items/', blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     stock_quantity = models.PositiveIntegerField(default=0, blank=True, null=True)
     sku = models.CharField(max_length=50, blank=True)
     duration_minutes = models.PositiveIntegerField(blank=True, null=True)
@@ -72,6 +81,13 @@ class BusinessItem(models.Model):
     
     class Meta:
         ordering = ['display_order', 'name']
+        indexes = [
+            # Active items of a business, in display order (public site)
+            models.Index(
+                fields=['business', 'is_active', 'display_order', 'name'],
+                name='item_active_display_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.business.name} - {self.name}"
@@ -115,23 +131,81 @@ class Booking(models.Model):
         return f"{self.business.name} - {self.customer_name} ({self.booking_date})"
 
 
+class BookingSlot(models.Model):
+    """
+    A calendar slot held by an appointment
+    
+    The unique constraint is the double-booking guard: two bookings
+    claiming the same slot can't both commit.
+    """
+    
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='booking_slots')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='slots')
+    date = models.DateField()
+    time = models.TimeField()
+    # Staff member/chair the slot belongs to; '' is the business's single calendar
+    resource = models.CharField(max_length=50, blank=True, default='')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['business', 'date', 'time', 'resource'],
+                name='unique_booking_slot',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.business_id} {self.date} {self.time} {self.resource}".rstrip()
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a booking submission, stored under the client's
+    Idempotency-Key so retries get it back instead of booking again
+    
+    Kept for IDEMPOTENCY_KEY_TTL seconds (see businesses/idempotency.py).
+    """
+    
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=100)
+    # sha256 of the submitted form, to catch a key reused for another request
+    request_hash = models.CharField(max_length=64)
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    response_status = models.PositiveSmallIntegerField(default=200)
+    response_body = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.business_id} {self.key}"
+
+
 # NEW: Daily statistics tracking model
 class DailyStatistics(models.Model):
     """Track daily statistics for detailed analytics"""
     
     business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='daily_stats')
     date = models.DateField(default=timezone.now)
+    # Hot businesses spread their writes over several rows per day
+    # (see businesses.counters); readers always Sum() over the day
+    shard = models.PositiveSmallIntegerField(default=0)
     
     # Traffic metrics
     visits = models.PositiveIntegerField(default=0)
     unique_visitors = models.PositiveIntegerField(default=0)
     qr_scans = models.PositiveIntegerField(default=0)
     menu_views = models.PositiveIntegerField(default=0)
+    bot_hits = models.PositiveIntegerField(default=0)  # crawler page events, not stored as events
     
     # Business metrics
     orders = models.PositiveIntegerField(default=0)
     bookings = models.PositiveIntegerField(default=0)
     revenue = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    appointments = models.PositiveIntegerField(default=0)  # bookings scheduled for this date
     
     # Customer metrics
     new_customers = models.PositiveIntegerField(default=0)
@@ -141,7 +215,7 @@ class DailyStatistics(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ['business', 'date']
+        unique_together = ['business', 'date', 'shard']
         ordering = ['-date']
         verbose_name_plural = 'Daily statistics'
     
@@ -149,6 +223,51 @@ class DailyStatistics(models.Model):
         return f"{self.business.name} - {self.date}"
 
 
+class VisitorSketch(models.Model):
+    """HyperLogLog sketch of one day's visitors (see businesses.visitors)"""
+    
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='visitor_sketches')
+    date = models.DateField()
+    registers = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['business', 'date']
+        ordering = ['-date']
+    
+    def sketch(self):
+        from businesses.hll import HyperLogLog
+        if not self.registers:
+            return HyperLogLog()
+        return HyperLogLog.from_bytes(bytes(self.registers))
+    
+    def __str__(self):
+        return f"{self.business.name} - {self.date} visitors"
+
+
+class UserAgent(models.Model):
+    """Distinct user agent strings shared by all events (see businesses.useragents)"""
+    
+    DEVICE_TYPES = [
+        ('desktop', 'Desktop'),
+        ('mobile', 'Mobile'),
+        ('tablet', 'Tablet'),
+        ('bot', 'Bot'),
+        ('other', 'Other'),
+    ]
+    
+    ua_hash = models.CharField(max_length=40, unique=True)  # sha1 of user_agent
+    user_agent = models.TextField()
+    device_type = models.CharField(max_length=20, choices=DEVICE_TYPES, default='other')
+    browser = models.CharField(max_length=50, blank=True)
+    os = models.CharField(max_length=50, blank=True)
+    is_bot = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.user_agent[:80]
+
+
 # NEW: Event tracking for detailed analytics
 class AnalyticsEvent(models.Model):
     """Track individual events for analytics"""
@@ -166,14 +285,15 @@ class AnalyticsEvent(models.Model):
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
     
     # Session tracking
-    session_id = models.CharField(max_length=100, blank=True)
+    session_id = models.CharField(max_length=40, blank=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
-    user_agent = models.TextField(blank=True)
+    agent = models.ForeignKey(UserAgent, on_delete=models.SET_NULL, blank=True, null=True, related_name='events')
     
     # Additional data
     metadata = models.JSONField(default=dict, blank=True)  # For storing extra info
     
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set when the event happens, not when a buffered batch is written
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     
     class Meta:
         ordering = ['-timestamp']
@@ -185,6 +305,35 @@ class AnalyticsEvent(models.Model):
         return f"{self.business.name} - {self.event_type} - {self.timestamp}"
 
 
+class HourlyStatistics(models.Model):
+    """Event counts per hour, rolled up from AnalyticsEvent by `manage.py rollup_events`"""
+    
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='hourly_stats')
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    event_type = models.CharField(max_length=20, choices=AnalyticsEvent.EVENT_TYPES)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['business', 'date', 'hour', 'event_type']
+        ordering = ['-date', 'hour']
+        verbose_name_plural = 'Hourly statistics'
+    
+    def __str__(self):
+        return f"{self.business.name} - {self.date} {self.hour:02d}:00 - {self.event_type}"
+
+
+class RollupCheckpoint(models.Model):
+    """Highest AnalyticsEvent id already rolled up, so rollups can resume"""
+    
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
 class Statistics(models.Model):
     """Aggregated statistics for the business"""
     
@@ -222,17 +371,8 @@ class Statistics(models.Model):
     # Helper methods for time-based queries
     def get_stats_for_period(self, days=7):
         """Get statistics for the last N days"""
-        start_date = timezone.now().date() - timedelta(days=days)
-        daily_stats = self.business.daily_stats.filter(date__gte=start_date)
-        
-        return {
-            'visits': sum(s.visits for s in daily_stats),
-            'qr_scans': sum(s.qr_scans for s in daily_stats),
-            'menu_views': sum(s.menu_views for s in daily_stats),
-            'orders': sum(s.orders for s in daily_stats),
-            'bookings': sum(s.bookings for s in daily_stats),
-            'revenue': sum(s.revenue for s in daily_stats),
-        }
+        from businesses.utils import calculate_period_stats
+        return calculate_period_stats(self.business, days=days)
     
     def get_today_stats(self):
         """Get today's statistics"""
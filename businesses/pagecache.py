@@ -0,0 +1,41 @@
+# businesses/pagecache.py
+"""
+Full-page cache for the public business websites
+
+The rendered HTML is stored per slug together with the business id and
+its 'site' version stamp. A hit only needs the entry and the current
+stamp from the cache, no database query; saving the business or any of
+its items bumps the stamp and the next request re-renders.
+
+Pages must not contain anything request-specific (CSRF tokens, user
+data). Visits are reported by the page's beacon, so they are still
+counted when the HTML comes from the cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from businesses.versioning import get_version
+
+
+def _key(slug):
+    return f"site:page:{slug}"
+
+
+def get_cached_page(slug):
+    """Return the cached HTML for a slug if it is still current, else None"""
+    entry = cache.get(_key(slug))
+    if entry is None:
+        return None
+
+    business_id, version, content = entry
+    if get_version('site', business_id) != version:
+        return None
+    return content
+
+
+def cache_page(slug, business_id, version, content):
+    """
+    Store rendered HTML; `version` must be the stamp read before the page
+    was built, so a change during rendering invalidates it immediately
+    """
+    cache.set(_key(slug), (business_id, version, content), settings.SITE_CACHE_TIMEOUT)
@@ -0,0 +1,113 @@
+# businesses/provisioning.py
+"""
+Slug allocation and bulk business creation
+
+Slugs are "<base>" or "<base>-<n>", where base is the slugified name.
+allocate_slugs() looks up all taken "<base>[-<n>]" slugs with one query
+per distinct base and hands out the lowest free ones. Two concurrent
+signups can still pick the same slug; the unique constraint catches
+that and the insert is retried with a fresh allocation.
+
+Usage:
+    businesses = provision_businesses([
+        Business(owner=owner, name='Coffee Lab', business_type='menu', phone='...'),
+        Business(owner=owner, name='Coffee Lab', business_type='menu', phone='...'),
+    ])
+    # -> slugs 'coffee-lab' and 'coffee-lab-1'
+"""
+import re
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+DEFAULT_SLUG = 'business'
+MAX_RETRIES = 3
+# Room left in the slug for a "-<n>" suffix
+SUFFIX_RESERVE = 6
+
+
+def base_slug(name):
+    from businesses.models import Business
+
+    max_length = Business._meta.get_field('slug').max_length
+    # Names without latin characters slugify to ''
+    return slugify(name)[:max_length - SUFFIX_RESERVE].strip('-') or DEFAULT_SLUG
+
+
+def taken_slugs(base):
+    """All existing slugs of the form <base> or <base>-<n>, in one query"""
+    from businesses.models import Business
+
+    # A prefix match can use the slug index; the suffix is checked here
+    pattern = re.compile(rf'{re.escape(base)}(-[0-9]+)?')
+    return {
+        slug
+        for slug in Business.objects.filter(slug__startswith=base).values_list('slug', flat=True)
+        if pattern.fullmatch(slug)
+    }
+
+
+def allocate_slugs(names):
+    """
+    Allocate a free slug for every name, in order
+
+    Duplicate names within the batch get distinct slugs.
+    """
+    bases = [base_slug(name) for name in names]
+
+    taken = {}
+    next_suffix = defaultdict(int)
+    slugs = []
+    for base in bases:
+        if base not in taken:
+            taken[base] = taken_slugs(base)
+
+        while True:
+            n = next_suffix[base]
+            next_suffix[base] += 1
+            slug = f"{base}-{n}" if n else base
+            if slug not in taken[base]:
+                break
+
+        taken[base].add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def provision_businesses(businesses, batch_size=500):
+    """
+    Create many businesses with unique slugs using bulk_create
+
+    Businesses that already have a slug keep it. On a slug conflict with
+    a concurrent insert, the batch is rolled back, re-allocated and retried
+    up to MAX_RETRIES times.
+
+    Returns:
+        list of the created businesses
+    """
+    from businesses import resolver
+    from businesses.models import Business
+
+    businesses = list(businesses)
+    needs_slug = {id(business) for business in businesses if not business.slug}
+
+    created = []
+    for start in range(0, len(businesses), batch_size):
+        batch = businesses[start:start + batch_size]
+        auto = [business for business in batch if id(business) in needs_slug]
+
+        for attempt in range(MAX_RETRIES):
+            for business, slug in zip(auto, allocate_slugs([b.name for b in auto])):
+                business.slug = slug
+            try:
+                with transaction.atomic():
+                    created.extend(Business.objects.bulk_create(batch))
+                break
+            except IntegrityError:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+
+    # bulk_create sends no signals; new slugs may be cached as unknown
+    resolver.invalidate()
+    return created
@@ -0,0 +1,130 @@
+# businesses/pubsub.py
+"""
+Live dashboard events
+
+Counter writes and new bookings publish small messages on a per-business
+channel; the dashboard's SSE endpoint subscribes to its business's channel
+and forwards them to the browser.
+
+The backend is pluggable through settings.PUBSUB_BACKEND (a dotted path to
+a Broker subclass). The default InMemoryBroker only reaches subscribers in
+the same process, which is enough for a single ASGI worker; multi-worker
+deployments need a shared backend (e.g. Redis pub/sub) implementing the
+same two methods.
+
+Usage:
+    publish(business.id, 'counters', {'date': '2025-01-31', 'deltas': {'visits': 3}})
+
+    async for message in get_broker().subscribe(channel_name(business.id)):
+        ...
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def channel_name(business_id):
+    return f"business:{business_id}"
+
+
+class Broker:
+    """Pub/sub backend interface"""
+
+    def publish(self, channel, message):
+        """Deliver `message` (a str) to the channel's subscribers; callable from any thread"""
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """Async iterator of the channel's messages, until the iterator is closed"""
+        raise NotImplementedError
+
+
+class _Subscription:
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        # Runs on the subscriber's loop. A client that can't keep up
+        # loses its oldest messages rather than growing without bound.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class InMemoryBroker(Broker):
+    """Process-local broker: one bounded asyncio queue per subscriber"""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's loop is gone
+                self._remove(channel, subscription)
+
+    async def subscribe(self, channel):
+        subscription = _Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        try:
+            while True:
+                yield await subscription.queue.get()
+        finally:
+            self._remove(channel, subscription)
+
+    def _remove(self, channel, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[channel]
+
+
+@lru_cache(maxsize=1)
+def get_broker():
+    return import_string(settings.PUBSUB_BACKEND)()
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    if setting == 'PUBSUB_BACKEND':
+        get_broker.cache_clear()
+
+
+def publish(business_id, event, data):
+    """
+    Publish an event to a business's channel once the current transaction
+    commits, so subscribers never see rolled-back writes
+    """
+    message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+
+    def send():
+        try:
+            get_broker().publish(channel_name(business_id), message)
+        except Exception:
+            # Live updates are best effort and must never fail a write
+            logger.exception("Could not publish %s event for business %s", event, business_id)
+
+    transaction.on_commit(send)
@@ -0,0 +1,75 @@
+# businesses/resolver.py
+"""
+Slug -> Business resolution for the public endpoints
+
+Two tiers sit in front of the database: a per-process LRU and the shared
+Django cache. Both are keyed by one global 'resolver' version stamp that
+Business save/delete bumps, so every worker drops its entries on the next
+lookup after a change. Unknown slugs are cached as well (for a shorter
+time), so bots probing random URLs don't reach the database.
+
+Usage:
+    business = get_business_or_404(business_slug)
+"""
+import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from businesses.useragents import LRUCache
+from businesses.versioning import bump_version, get_version
+
+# The resolver has one stamp for all businesses: a slug can move from
+# one business to another
+VERSION_SCOPE = 'resolver'
+VERSION_OWNER = 'all'
+
+MISSING = 'missing'
+
+_local = LRUCache(getattr(settings, 'BUSINESS_RESOLVER_CACHE_SIZE', 1024))
+
+
+def _key(version, slug):
+    return f"resolver:business:{version}:{slug}"
+
+
+def resolve_business(slug):
+    """Return the Business with this slug, or None"""
+    from businesses.models import Business
+
+    version = get_version(VERSION_SCOPE, VERSION_OWNER)
+
+    entry = _local.get(slug)
+    if entry is not None and entry[0] == version:
+        business = entry[1]
+    else:
+        business = cache.get(_key(version, slug))
+        if business is None:
+            business = Business.objects.filter(slug=slug).first()
+            if business is None:
+                cache.set(_key(version, slug), MISSING, settings.BUSINESS_RESOLVER_NEGATIVE_TIMEOUT)
+            else:
+                cache.set(_key(version, slug), business, settings.BUSINESS_RESOLVER_TIMEOUT)
+        elif business == MISSING:
+            business = None
+        _local.set(slug, (version, business))
+
+    # Callers get their own copy of the shared instance
+    return copy.copy(business) if business is not None else None
+
+
+def get_business_or_404(slug, active_only=True):
+    business = resolve_business(slug)
+    if business is None or (active_only and not business.is_active):
+        raise Http404("No Business matches the given query.")
+    return business
+
+
+def invalidate():
+    """Drop every cached resolution (in all workers)"""
+    bump_version(VERSION_SCOPE, VERSION_OWNER)
+
+
+def clear_local_cache():
+    _local.clear()
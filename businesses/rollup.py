@@ -0,0 +1,149 @@
+# businesses/rollup.py
+"""
+Roll raw AnalyticsEvent rows up into HourlyStatistics and prune old ones
+
+Events are processed in id order, one chunk per transaction. The chunk's
+hourly counts and the new RollupCheckpoint are committed together, so an
+interrupted run resumes where it stopped and re-running never counts an
+event twice. The chunk's visits are also merged into the daily unique
+visitor sketches (businesses.visitors). Only events already rolled up are ever pruned; with
+--archive they are written to cold storage first (businesses.archive).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+CHECKPOINT_NAME = 'analytics_events'
+
+# Events younger than this are left for the next run, so rows from
+# transactions that commit out of id order are not skipped
+SETTLE_DELAY = timedelta(minutes=5)
+
+
+def rollup_chunk(chunk_size=5000):
+    """
+    Roll up the next chunk of events
+
+    Returns:
+        number of events rolled up (0 when there is nothing left)
+    """
+    from businesses.models import AnalyticsEvent, HourlyStatistics, RollupCheckpoint
+
+    settled = timezone.now() - SETTLE_DELAY
+
+    with transaction.atomic():
+        # The row lock keeps concurrent rollups from working on the same chunk
+        checkpoint, _ = RollupCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        checkpoint = RollupCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+
+        # Stop at the first event that hasn't settled yet
+        ids = []
+        for event_id, timestamp in AnalyticsEvent.objects.filter(
+            id__gt=checkpoint.last_event_id
+        ).order_by('id').values_list('id', 'timestamp')[:chunk_size]:
+            if timestamp >= settled:
+                break
+            ids.append(event_id)
+
+        if not ids:
+            return 0
+
+        groups = AnalyticsEvent.objects.filter(
+            id__gt=checkpoint.last_event_id, id__lte=ids[-1]
+        ).annotate(
+            date=TruncDate('timestamp'),
+            hour=ExtractHour('timestamp'),
+        ).order_by().values(
+            'business_id', 'date', 'hour', 'event_type'
+        ).annotate(n=Count('id'))
+
+        counts = {
+            (g['business_id'], g['date'], g['hour'], g['event_type']): g['n']
+            for g in groups
+        }
+
+        existing = {}
+        for row in HourlyStatistics.objects.filter(
+            business_id__in={key[0] for key in counts},
+            date__in={key[1] for key in counts},
+        ):
+            existing[(row.business_id, row.date, row.hour, row.event_type)] = row
+
+        to_update, to_create = [], []
+        for key, n in counts.items():
+            row = existing.get(key)
+            if row is not None:
+                row.count += n
+                to_update.append(row)
+            else:
+                business_id, date, hour, event_type = key
+                to_create.append(HourlyStatistics(
+                    business_id=business_id, date=date, hour=hour,
+                    event_type=event_type, count=n,
+                ))
+
+        HourlyStatistics.objects.bulk_update(to_update, ['count'], batch_size=500)
+        HourlyStatistics.objects.bulk_create(to_create, batch_size=500)
+
+        _record_visits(checkpoint.last_event_id, ids[-1])
+
+        checkpoint.last_event_id = ids[-1]
+        checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+
+    return len(ids)
+
+
+def _record_visits(after_id, last_id):
+    from businesses.models import AnalyticsEvent
+    from businesses.visitors import record_visits, visitor_key
+
+    visits = AnalyticsEvent.objects.filter(
+        id__gt=after_id, id__lte=last_id, event_type='visit'
+    ).values_list('business_id', 'timestamp', 'session_id', 'ip_address', 'agent_id')
+
+    record_visits(
+        (business_id, timestamp.date(), visitor_key(session_id, ip_address, agent_id))
+        for business_id, timestamp, session_id, ip_address, agent_id in visits.iterator()
+    )
+
+
+def prune_chunk(retention_days, chunk_size=5000, archive_format=None):
+    """
+    Delete the next chunk of rolled-up events older than the retention window,
+    first writing them to cold storage when `archive_format` is given
+
+    Returns:
+        number of events deleted
+    """
+    from businesses.archive import ARCHIVE_FIELDS, write_events
+    from businesses.models import AnalyticsEvent, RollupCheckpoint
+
+    checkpoint = RollupCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+    if checkpoint is None:
+        return 0
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = AnalyticsEvent.objects.filter(
+        id__lte=checkpoint.last_event_id, timestamp__lt=cutoff
+    ).order_by('id')
+
+    if archive_format:
+        # Archives keep the full user agent string so they stand alone
+        rows = list(
+            expired.annotate(user_agent=F('agent__user_agent'))
+            .values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        ids = [row['id'] for row in rows]
+        if ids:
+            write_events(rows, archive_format)
+    else:
+        ids = list(expired.values_list('id', flat=True)[:chunk_size])
+
+    if not ids:
+        return 0
+
+    AnalyticsEvent.objects.filter(id__in=ids).delete()
+    return len(ids)
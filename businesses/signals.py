@@ -0,0 +1,173 @@
+# businesses/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from businesses.counters import incr, incr_many
+from businesses.models import Booking, Business, BusinessItem
+from businesses import resolver
+from businesses.availability import claim_slots, release_slots
+from businesses.images import IMAGE_FIELDS, delete_variants, schedule_variants, variants_field
+from businesses.pubsub import publish
+from businesses.versioning import bump_version
+
+
+def _as_date(booking, field_name):
+    # Views create bookings straight from POST strings
+    return booking._meta.get_field(field_name).to_python(getattr(booking, field_name))
+
+
+def apply_booking_deltas(booking, sign):
+    """
+    Count (sign=1) or un-count (sign=-1) a booking in the daily counters
+
+    The booking and its revenue belong to the day it was made, the
+    appointment to the day it is scheduled for.
+    """
+    incr_many(booking.business_id, booking.created_at.date(), {
+        'bookings': sign,
+        'revenue': sign * booking.total_amount,
+    })
+    booking_date = _as_date(booking, 'booking_date')
+    if booking_date:
+        incr(booking.business_id, booking_date, 'appointments', sign)
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_state(sender, instance, **kwargs):
+    instance._original_status = instance.status
+    instance._original_booking_date = instance.booking_date
+    instance._original_booking_time = instance.booking_time
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    was_cancelled = instance._original_status == 'cancelled'
+    is_cancelled = instance.status == 'cancelled'
+    original_date = instance._original_booking_date
+    original_time = instance._original_booking_time
+    remember_booking_state(sender, instance)
+
+    if created:
+        # Every booking is counted and claims its slots here, however it was
+        # made (site, admin, shell), so cancelling one always has something
+        # to subtract and no booking bypasses the double-booking guard
+        if not is_cancelled:
+            claim_slots(instance, getattr(instance, '_duration_minutes', None))
+            apply_booking_deltas(instance, 1)
+        booking_date = _as_date(instance, 'booking_date')
+        publish(instance.business_id, 'booking', {
+            'id': instance.pk,
+            'booking_type': instance.booking_type,
+            'customer_name': instance.customer_name,
+            'booking_date': booking_date,
+            'booking_time': instance.booking_time,
+            'total_amount': instance.total_amount,
+            'status': instance.status,
+        })
+    elif is_cancelled and not was_cancelled:
+        apply_booking_deltas(instance, -1)
+    elif was_cancelled and not is_cancelled:
+        apply_booking_deltas(instance, 1)
+    elif not is_cancelled:
+        # Rescheduled: move the appointment to its new day
+        old_date = Booking._meta.get_field('booking_date').to_python(original_date)
+        new_date = _as_date(instance, 'booking_date')
+        if old_date != new_date:
+            if old_date:
+                incr(instance.business_id, old_date, 'appointments', -1)
+            if new_date:
+                incr(instance.business_id, new_date, 'appointments')
+
+    if not created:
+        to_python = Booking._meta.get_field('booking_time').to_python
+        moved = (
+            Booking._meta.get_field('booking_date').to_python(original_date) != _as_date(instance, 'booking_date')
+            or to_python(original_time) != to_python(instance.booking_time)
+        )
+        sync_booking_slots(instance, was_cancelled, moved)
+
+
+def sync_booking_slots(booking, was_cancelled, moved):
+    """
+    Release a cancelled booking's slots and claim them again when it is
+    restored or rescheduled
+
+    New bookings claim theirs in update_booking_counters. Claiming can
+    raise SlotUnavailable, so bookings should be saved inside a
+    transaction.
+    """
+    if booking.status == 'cancelled':
+        if not was_cancelled:
+            release_slots(booking)
+    elif was_cancelled or moved:
+        release_slots(booking)
+        claim_slots(booking)
+
+
+@receiver(m2m_changed, sender=Booking.selected_items.through)
+def resize_booking_slots(sender, instance, action, reverse, **kwargs):
+    """
+    Claim an appointment's slots again for the length of its services
+
+    The admin and forms save the services after the booking, which was
+    created holding its first slot only. create_booking inserts the
+    services without this signal, having claimed the full length already.
+    """
+    if reverse or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if instance.status != 'cancelled':
+        release_slots(instance)
+        claim_slots(instance)
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+def business_changed(sender, instance, **kwargs):
+    bump_version('dashboard', instance.pk)
+    bump_version('site', instance.pk)
+    resolver.invalidate()
+
+
+@receiver(post_save, sender=BusinessItem)
+@receiver(post_delete, sender=BusinessItem)
+def item_changed(sender, instance, **kwargs):
+    bump_version('dashboard', instance.business_id)
+    bump_version('site', instance.business_id)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    bump_version('dashboard', instance.business_id)
+    # After commit, so availability can't be re-cached from the old state
+    # while the booking's transaction is still open
+    transaction.on_commit(lambda: bump_version('bookings', instance.business_id))
+
+
+@receiver(post_save, sender=Business)
+@receiver(post_save, sender=BusinessItem)
+def process_uploaded_images(sender, instance, raw=False, **kwargs):
+    """Queue variant generation for image fields whose file changed"""
+    if raw:
+        return
+
+    for field_name in IMAGE_FIELDS[sender._meta.label]:
+        name = getattr(instance, field_name).name or ''
+        meta_field = variants_field(field_name)
+        metadata = getattr(instance, meta_field)
+        if metadata.get('source', '') == name:
+            continue
+
+        if name:
+            schedule_variants(instance, field_name)
+        else:
+            # Image removed
+            sender.objects.filter(pk=instance.pk).update(**{meta_field: {}})
+            storage = getattr(instance, field_name).storage
+            transaction.on_commit(partial(delete_variants, storage, metadata))
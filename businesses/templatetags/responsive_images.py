@@ -0,0 +1,59 @@
+# businesses/templatetags/responsive_images.py
+"""
+Template helpers for images with responsive variants (businesses.images)
+
+Usage:
+    {% load responsive_images %}
+    {% responsive_image business 'cover_image' sizes='100vw' class='cover' alt=business.name %}
+    <img src="{{ item.image.url }}" srcset="{{ item|srcset:'image' }}">
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from businesses.images import CONTENT_TYPES, variants_for
+
+register = template.Library()
+
+
+def _srcset(storage, variants):
+    return ', '.join(f"{storage.url(v['name'])} {v['width']}w" for v in variants)
+
+
+@register.filter
+def srcset(instance, field_name):
+    """srcset attribute value of the JPEG variants ('' before processing)"""
+    storage = getattr(instance, field_name).storage
+    return _srcset(storage, variants_for(instance, field_name, 'jpeg'))
+
+
+@register.simple_tag
+def responsive_image(instance, field_name, sizes='100vw', alt='', loading='lazy', **attrs):
+    """
+    <picture> with a WebP source and a JPEG <img> fallback
+
+    Falls back to a plain <img> of the original upload until the
+    variants exist, and renders nothing without an image.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return ''
+
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    jpeg = variants_for(instance, field_name, 'jpeg')
+    if not jpeg:
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}"{}>', field_file.url, alt, loading, extra,
+        )
+
+    storage = field_file.storage
+    largest = jpeg[-1]
+    webp = variants_for(instance, field_name, 'webp')
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        [(CONTENT_TYPES['webp'], _srcset(storage, webp), sizes)] if webp else [],
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}"{}></picture>',
+        sources, storage.url(largest['name']), _srcset(storage, jpeg), sizes,
+        largest['width'], largest['height'], alt, loading, extra,
+    )
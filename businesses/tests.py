@@ -1,3 +1,1597 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F, Sum
+from django.http import Http404
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+try:
+    import openpyxl
+except ImportError:  # optional dependency
+    openpyxl = None
+
+from . import resolver
+from .archive import iter_archived_events, write_events
+from .availability import SlotUnavailable, free_slots, occupancy
+from .catalog import import_catalog, iter_catalog_csv, read_rows, write_catalog_xlsx
+from .counters import _upsert, incr, incr_many
+from .images import variants_for
+from .ingest import EventBuffer
+from .models import (
+    AnalyticsEvent, Booking, BookingSlot, Business, BusinessItem, DailyStatistics, HourlyStatistics,
+    IdempotencyKey, RollupCheckpoint, Statistics, VisitorSketch,
+)
+from .pagecache import cache_page, get_cached_page
+from .provisioning import allocate_slugs, base_slug, provision_businesses, taken_slugs
+from .rollup import CHECKPOINT_NAME, prune_chunk, rollup_chunk
+from .useragents import is_bot
+from .utils import (
+    aggregate_windows, calculate_hourly_heatmap, calculate_total_stats, comparison_windows,
+    load_site_items, track_event,
+)
+from .versioning import bump_version, get_version
+from .views import MAX_BEACON_EVENTS
+
+
+# Templates are rendered without running collectstatic first
+PLAIN_STATIC_STORAGES = {
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class BusinessTestMixin:
+    """Gives each test an owner and their business, with an empty cache"""
+
+    business_name = 'Cafe'
+    business_type = 'menu'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='secret')
+        self.business = Business.objects.create(
+            owner=self.owner, name=self.business_name, business_type=self.business_type,
+            phone='+380000000000',
+        )
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class PublicSiteQueryTests(TestCase):
+    """The public site loads a business's items with a single query"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='secret')
+
+    def create_business(self, business_type):
+        business = Business.objects.create(
+            owner=self.owner,
+            name=f"Test {business_type}",
+            business_type=business_type,
+            phone='+380000000000',
+        )
+        for item_type, category in (
+            ('menu_item', 'Drinks'), ('menu_item', 'Food'),
+            ('product', 'Gifts'), ('service', 'Hair'), ('service', 'Hair'),
+        ):
+            BusinessItem.objects.create(
+                business=business, item_type=item_type, category=category,
+                name=f"{item_type} {category}", price=10,
+            )
+        BusinessItem.objects.create(
+            business=business, item_type='product', name='Hidden', price=1, is_active=False,
+        )
+        return business
+
+    def test_item_loading_is_one_query_per_business_type(self):
+        for business_type, _ in Business.BUSINESS_TYPES:
+            with self.subTest(business_type=business_type):
+                business = self.create_business(business_type)
+                with self.assertNumQueries(1):
+                    context = load_site_items(business)
+                    # Touch everything a template could use
+                    for name in ('items', 'menu_items', 'products', 'services'):
+                        for item in context[name]:
+                            str(item)
+                    list(context['categories'].items())
+
+    def test_items_are_partitioned_in_display_order(self):
+        business = self.create_business('menu')
+        BusinessItem.objects.filter(business=business, name='menu_item Food').update(display_order=0)
+        BusinessItem.objects.filter(business=business, name='menu_item Drinks').update(display_order=1)
+
+        context = load_site_items(business)
+
+        self.assertEqual(len(context['items']), 5)
+        self.assertEqual(
+            [item.name for item in context['menu_items']],
+            ['menu_item Food', 'menu_item Drinks'],
+        )
+        self.assertEqual([item.name for item in context['products']], ['product Gifts'])
+        self.assertEqual(len(context['services']), 2)
+        self.assertEqual(list(context['categories']), ['Food', 'Gifts', 'Hair', 'Drinks'])
+        self.assertEqual(len(context['categories']['Hair']), 2)
+
+    def test_booking_site_queries(self):
+        business = self.create_business('booking')
+
+        # Business lookup and items
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/{business.slug}/')
+        self.assertEqual(response.status_code, 200)
+
+        # Served from the page cache
+        with self.assertNumQueries(0):
+            self.client.get(f'/{business.slug}/')
+
+
+class ResolverTests(BusinessTestMixin, TestCase):
+    """Slug lookups are cached, including misses, until a business changes"""
+
+    business_name = 'Barber'
+    business_type = 'booking'
+
+    def setUp(self):
+        super().setUp()
+        resolver.clear_local_cache()
+
+    def test_lookups_are_cached(self):
+        with self.assertNumQueries(1):
+            resolver.resolve_business(self.business.slug)
+        with self.assertNumQueries(0):
+            business = resolver.resolve_business(self.business.slug)
+
+        self.assertEqual(business, self.business)
+
+    def test_shared_cache_serves_other_workers(self):
+        resolver.resolve_business(self.business.slug)
+        # A worker with an empty local cache
+        resolver.clear_local_cache()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve_business(self.business.slug), self.business)
+
+    def test_unknown_slugs_are_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolver.resolve_business('nope'))
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                resolver.get_business_or_404('nope')
+
+    def test_new_business_replaces_a_cached_miss(self):
+        resolver.resolve_business('new-place')
+
+        Business.objects.create(
+            owner=self.owner, name='New Place', business_type='menu', phone='+380000000000',
+        )
+
+        self.assertEqual(resolver.resolve_business('new-place').name, 'New Place')
+
+    def test_business_save_invalidates(self):
+        resolver.resolve_business(self.business.slug)
+
+        self.business.name = 'Renamed'
+        self.business.is_active = False
+        self.business.save()
+
+        self.assertEqual(resolver.resolve_business(self.business.slug).name, 'Renamed')
+        with self.assertRaises(Http404):
+            resolver.get_business_or_404(self.business.slug)
+        self.assertEqual(resolver.get_business_or_404(self.business.slug, active_only=False), self.business)
+
+    def test_callers_get_their_own_copy(self):
+        resolver.resolve_business(self.business.slug).name = 'Changed by a caller'
+
+        self.assertEqual(resolver.resolve_business(self.business.slug).name, 'Barber')
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class PageCacheTests(BusinessTestMixin, TestCase):
+    """Cached pages are served until the business or its items change"""
+
+    business_name = 'Barber'
+    business_type = 'booking'
+
+    def setUp(self):
+        super().setUp()
+        resolver.clear_local_cache()
+        self.item = BusinessItem.objects.create(
+            business=self.business, item_type='service', name='Haircut', price=300,
+        )
+        self.url = f'/{self.business.slug}/'
+
+    def get(self):
+        return self.client.get(self.url)['X-Page-Cache']
+
+    def test_second_request_is_a_hit(self):
+        self.assertEqual(self.get(), 'miss')
+        self.assertEqual(self.get(), 'hit')
+
+    def test_business_save_invalidates(self):
+        self.get()
+
+        self.business.name = 'Barber & Co'
+        self.business.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Barber &amp; Co')
+
+    def test_item_save_and_delete_invalidate(self):
+        self.get()
+        self.item.price = 350
+        self.item.save()
+        self.assertEqual(self.get(), 'miss')
+
+        self.item.delete()
+        self.assertEqual(self.get(), 'miss')
+        self.assertEqual(self.get(), 'hit')
+
+    def test_other_business_changes_do_not_invalidate(self):
+        self.get()
+
+        bump_version('site', self.business.pk + 1)
+
+        self.assertEqual(self.get(), 'hit')
+
+    def test_page_built_before_a_change_is_never_served(self):
+        # Rendering started before the bump, finished after it
+        version = get_version('site', self.business)
+        bump_version('site', self.business)
+        cache_page(self.business.slug, self.business.pk, version, b'stale')
+
+        self.assertIsNone(get_cached_page(self.business.slug))
+        self.assertEqual(self.get(), 'miss')
+
+
+class CreateBookingTests(BusinessTestMixin, TestCase):
+    """Booking creation is atomic and costs a fixed number of queries"""
+
+    business_name = 'Barber'
+    business_type = 'booking'
+
+    # Transaction (2), item check, booking insert, item links, booking
+    # and revenue counter, appointment counter; after commit: the booking
+    # event
+    QUERIES_PER_BOOKING = 8
+
+    def setUp(self):
+        super().setUp()
+        self.items = [
+            BusinessItem.objects.create(
+                business=self.business, item_type='service', name=f"Service {i}", price=100 + i,
+            )
+            for i in range(5)
+        ]
+        self.url = f'/{self.business.slug}/book/'
+
+    def book(self, item_ids, **data):
+        data = {
+            'customer_name': 'Customer',
+            'customer_phone': '+380111111111',
+            'booking_date': '2030-01-15',
+            'selected_items': item_ids,
+            **data,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data)
+
+    def test_query_count_does_not_depend_on_item_count(self):
+        # Warm up: creates the day's counter rows and caches the business
+        self.book([self.items[0].id])
+
+        for count in (1, 3, 5):
+            with self.subTest(items=count):
+                with self.assertNumQueries(self.QUERIES_PER_BOOKING):
+                    response = self.book([item.id for item in self.items[:count]])
+                self.assertEqual(response.status_code, 200)
+
+    def test_total_is_computed_from_items(self):
+        response = self.book([self.items[0].id, self.items[2].id])
+
+        booking = Booking.objects.get(pk=response.json()['booking_id'])
+        self.assertEqual(booking.total_amount, 202)
+        self.assertEqual(booking.booking_type, 'appointment')
+        self.assertEqual(
+            sorted(booking.selected_items.values_list('id', flat=True)),
+            [self.items[0].id, self.items[2].id],
+        )
+
+    def test_items_of_another_business_are_rejected(self):
+        other = Business.objects.create(
+            owner=self.business.owner, name='Other', business_type='shop', phone='+380000000000',
+        )
+        foreign = BusinessItem.objects.create(business=other, item_type='product', name='X', price=1)
+
+        response = self.book([self.items[0].id, foreign.id])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_invalid_date_is_rejected(self):
+        response = self.book([], booking_date='not-a-date')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+
+class CounterTests(BusinessTestMixin, TestCase):
+    """Daily counters are applied in SQL and never lose updates"""
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.now().date()
+
+    def day(self, **filters):
+        return DailyStatistics.objects.filter(business=self.business, date=self.today, **filters)
+
+    def test_increments_are_applied_in_place(self):
+        incr(self.business, self.today, 'visits')
+
+        # Existing row: one UPDATE, and no write to the all-time totals
+        with self.assertNumQueries(1):
+            incr_many(self.business, self.today, {'visits': 2, 'revenue': Decimal('9.50')})
+
+        row = self.day().get()
+        self.assertEqual((row.visits, row.revenue), (3, Decimal('9.50')))
+        totals = calculate_total_stats(self.business)
+        self.assertEqual((totals['total_visits'], totals['total_revenue']), (3, Decimal('9.50')))
+        self.assertFalse(Statistics.objects.exists())
+
+    def test_zero_deltas_and_unknown_fields(self):
+        with self.assertNumQueries(0):
+            incr(self.business, self.today, 'visits', 0)
+        with self.assertRaises(ValueError):
+            incr(self.business, self.today, 'unique_visitors')
+
+    def test_negative_deltas(self):
+        incr(self.business, self.today, 'bookings', 3)
+        incr(self.business, self.today, 'bookings', -2)
+
+        self.assertEqual(self.day().get().bookings, 1)
+        # Counters can't go below zero
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            incr(self.business, self.today, 'bookings', -2)
+        self.assertEqual(self.day().get().bookings, 1)
+
+    def test_lost_insert_race_falls_back_to_update(self):
+        # Another worker inserts the day's row between our UPDATE and INSERT
+        DailyStatistics.objects.create(business=self.business, date=self.today, visits=5)
+        rows = self.day()
+
+        class RacingRows:
+            calls = 0
+
+            def update(self, **updates):
+                RacingRows.calls += 1
+                return 0 if RacingRows.calls == 1 else rows.update(**updates)
+
+        _upsert(
+            RacingRows(), {'visits': F('visits') + 1},
+            lambda: DailyStatistics(business=self.business, date=self.today, visits=1),
+        )
+
+        self.assertEqual(self.day().get().visits, 6)
+
+    def test_hot_businesses_spread_over_shards(self):
+        with override_settings(DAILY_STATS_HOT_SHARDS={self.business.pk: 4}):
+            for _ in range(40):
+                incr(self.business, self.today, 'visits')
+
+            shards = set(self.day().values_list('shard', flat=True))
+            self.assertGreater(len(shards), 1)
+            self.assertLessEqual(shards, {0, 1, 2, 3})
+            self.assertEqual(self.day().aggregate(total=Sum('visits'))['total'], 40)
+
+            # Decrements find a shard that can take them
+            for _ in range(40):
+                incr(self.business, self.today, 'visits', -1)
+            self.assertEqual(self.day().aggregate(total=Sum('visits'))['total'], 0)
+
+        self.assertEqual(calculate_total_stats(self.business)['total_visits'], 0)
+
+
+class BookingCounterTests(BusinessTestMixin, TestCase):
+    """Bookings are counted the same way they are un-counted"""
+
+    def totals(self):
+        return DailyStatistics.objects.filter(business=self.business).aggregate(
+            bookings=Sum('bookings'), revenue=Sum('revenue'), appointments=Sum('appointments'),
+        )
+
+    def test_booking_made_outside_the_site_can_be_cancelled(self):
+        # As the admin or a shell would create it
+        booking = Booking.objects.create(
+            business=self.business, booking_type='reservation', customer_name='Customer',
+            customer_phone='+380111111111', booking_date='2030-01-15', total_amount=120,
+        )
+        self.assertEqual(self.totals(), {'bookings': 1, 'revenue': 120, 'appointments': 1})
+
+        booking.status = 'cancelled'
+        booking.save()
+
+        self.assertEqual(self.totals(), {'bookings': 0, 'revenue': 0, 'appointments': 0})
+
+    def test_invalid_decrement_is_not_swallowed(self):
+        # No row for the day yet: the insert fails the non-negative check
+        with self.assertRaises(IntegrityError):
+            incr(self.business, timezone.now().date(), 'bookings', -1)
+
+
+class RebuildStatisticsTests(BusinessTestMixin, TestCase):
+    def test_booking_counters_are_recounted_from_bookings(self):
+        Booking.objects.create(
+            business=self.business, booking_type='reservation', customer_name='Customer',
+            customer_phone='+380111111111', booking_date='2030-01-15', total_amount=100,
+        )
+        # Drift: counts that no booking accounts for
+        DailyStatistics.objects.filter(business=self.business).update(bookings=5, revenue=0, appointments=3)
+
+        call_command('rebuild_statistics', stdout=io.StringIO())
+
+        day = DailyStatistics.objects.filter(business=self.business).aggregate(
+            bookings=Sum('bookings'), revenue=Sum('revenue'), appointments=Sum('appointments'),
+        )
+        self.assertEqual(day, {'bookings': 1, 'revenue': 100, 'appointments': 1})
+        stats = Statistics.objects.get(business=self.business)
+        self.assertEqual((stats.total_bookings, stats.total_revenue), (1, 100))
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs data migrations against rows written by an older schema"""
+
+    def migrate(self, targets=None):
+        """Migrate to `targets` (default: latest) and return the historical apps"""
+        executor = MigrationExecutor(connection)
+        targets = targets or executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate()
+
+
+class BookingCounterMigrationTests(MigrationTestCase):
+    """Bookings made before the counters existed are backfilled into them"""
+
+    def test_booking_made_before_the_migration_can_be_cancelled(self):
+        apps = self.migrate([('businesses', '0012_dailystatistics_bot_hits')])
+
+        # As the baseline left it: the booking event counted, nothing else
+        owner = apps.get_model('auth', 'User').objects.create(username='owner')
+        business = apps.get_model('businesses', 'Business').objects.create(
+            owner_id=owner.pk, name='Cafe', slug='cafe', business_type='menu', phone='+380000000000',
+        )
+        apps.get_model('businesses', 'Booking').objects.create(
+            business_id=business.pk, booking_type='reservation', customer_name='Customer',
+            customer_phone='+380111111111', booking_date='2030-01-15', total_amount=100,
+        )
+        apps.get_model('businesses', 'DailyStatistics').objects.create(
+            business_id=business.pk, date=timezone.now().date(), bookings=1,
+        )
+
+        self.migrate()
+
+        booking = Booking.objects.get()
+        booking.status = 'cancelled'
+        booking.save()
+
+        totals = calculate_total_stats(booking.business)
+        self.assertEqual((totals['total_bookings'], totals['total_revenue']), (0, 0))
+        self.assertFalse(DailyStatistics.objects.filter(appointments__gt=0).exists())
+
+
+class DoubleBookingTests(BusinessTestMixin, TestCase):
+    """An appointment's slots can only be held by one booking"""
+
+    business_name = 'Barber'
+    business_type = 'booking'
+
+    def setUp(self):
+        super().setUp()
+        self.haircut = BusinessItem.objects.create(
+            business=self.business, item_type='service', name='Haircut', price=300,
+            duration_minutes=45,
+        )
+        self.url = f'/{self.business.slug}/book/'
+
+    def book(self, booking_time):
+        data = {
+            'customer_name': 'Customer',
+            'customer_phone': '+380111111111',
+            'booking_date': '2030-01-15',
+            'booking_time': booking_time,
+            'selected_items': [self.haircut.id],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data)
+
+    def test_booking_claims_its_slots(self):
+        response = self.book('10:00')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [slot.time.strftime('%H:%M') for slot in BookingSlot.objects.order_by('time')],
+            ['10:00', '10:15', '10:30'],
+        )
+
+    def test_overlapping_booking_is_rejected(self):
+        self.book('10:00')
+
+        response = self.book('10:30')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(BookingSlot.objects.count(), 3)
+
+    def test_adjacent_booking_is_accepted(self):
+        self.book('10:00')
+
+        self.assertEqual(self.book('10:45').status_code, 200)
+
+    def test_cancelling_releases_the_slots(self):
+        booking = Booking.objects.get(pk=self.book('10:00').json()['booking_id'])
+
+        booking.status = 'cancelled'
+        booking.save()
+
+        self.assertFalse(BookingSlot.objects.exists())
+        self.assertEqual(self.book('10:00').status_code, 200)
+
+    def test_rescheduling_moves_the_slots(self):
+        booking = Booking.objects.get(pk=self.book('10:00').json()['booking_id'])
+
+        booking.booking_time = '14:00'
+        booking.save()
+
+        self.assertEqual(
+            [slot.time.strftime('%H:%M') for slot in BookingSlot.objects.order_by('time')],
+            ['14:00', '14:15', '14:30'],
+        )
+
+
+    def test_admin_booking_blocks_the_public_site(self):
+        admin = User.objects.create_superuser(username='admin', password='secret')
+        self.client.force_login(admin)
+        response = self.client.post('/admin/businesses/booking/add/', {
+            'business': self.business.pk,
+            'booking_type': 'appointment',
+            'customer_name': 'Walk-in',
+            'customer_phone': '+380222222222',
+            'booking_date': '2030-01-15',
+            'booking_time': '10:00',
+            'selected_items': [self.haircut.pk],
+            'total_amount': '300',
+            'status': 'confirmed',
+        })
+        self.assertEqual(response.status_code, 302)
+
+        # The admin saves the services after the booking: all 45 minutes are held
+        self.assertEqual(BookingSlot.objects.count(), 3)
+        self.assertEqual(self.book('10:30').status_code, 409)
+
+    def test_booking_made_in_code_cannot_take_a_held_slot(self):
+        self.book('10:00')
+
+        with self.assertRaises(SlotUnavailable), transaction.atomic():
+            Booking.objects.create(
+                business=self.business, booking_type='appointment', customer_name='Customer',
+                customer_phone='+380111111111', booking_date='2030-01-15', booking_time='10:15',
+            )
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class BookingSlotMigrationTests(MigrationTestCase):
+    """Appointments made before slots existed hold them after the migration"""
+
+    def test_existing_appointment_blocks_its_time(self):
+        apps = self.migrate([('businesses', '0015_image_variants')])
+        owner = apps.get_model('auth', 'User').objects.create(username='owner')
+        business = apps.get_model('businesses', 'Business').objects.create(
+            owner_id=owner.pk, name='Barber', slug='barber', business_type='booking',
+            phone='+380000000000',
+        )
+        haircut = apps.get_model('businesses', 'BusinessItem').objects.create(
+            business_id=business.pk, item_type='service', name='Haircut', price=300,
+            duration_minutes=45,
+        )
+        Booking = apps.get_model('businesses', 'Booking')
+        for booking_date, status in (('2030-01-15', 'confirmed'), ('2030-01-16', 'cancelled'), ('2020-01-15', 'confirmed')):
+            Booking.objects.create(
+                business_id=business.pk, booking_type='appointment', customer_name='Customer',
+                customer_phone='+380111111111', booking_date=booking_date, booking_time='10:00',
+                status=status,
+            ).selected_items.add(haircut)
+
+        self.migrate()
+
+        # Only the active future appointment, for the length of its service
+        self.assertEqual(
+            [(str(slot.date), slot.time.strftime('%H:%M')) for slot in BookingSlot.objects.order_by('time')],
+            [('2030-01-15', '10:00'), ('2030-01-15', '10:15'), ('2030-01-15', '10:30')],
+        )
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ConcurrentBookingTests(BusinessTestMixin, TransactionTestCase):
+    """Stress test: many clients booking the same time at once"""
+
+    business_name = 'Barber'
+    business_type = 'booking'
+
+    CLIENTS = 8
+
+    def setUp(self):
+        super().setUp()
+        self.haircut = BusinessItem.objects.create(
+            business=self.business, item_type='service', name='Haircut', price=300,
+            duration_minutes=30,
+        )
+
+    def test_no_double_bookings(self):
+        barrier = threading.Barrier(self.CLIENTS)
+        statuses = []
+
+        def book(n):
+            client = Client(raise_request_exception=False)
+            try:
+                barrier.wait()
+                # Overlapping starts: every booking covers the 10:15 slot
+                response = client.post(f'/{self.business.slug}/book/', {
+                    'customer_name': f"Customer {n}",
+                    'customer_phone': '+380111111111',
+                    'booking_date': '2030-01-15',
+                    'booking_time': '10:15' if n % 2 else '10:00',
+                    'selected_items': [self.haircut.id],
+                })
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(n,)) for n in range(self.CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # One winner; every other client is told the time is taken
+        self.assertEqual(sorted(statuses), [200] + [409] * (self.CLIENTS - 1))
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(
+            BookingSlot.objects.filter(booking=Booking.objects.get()).count(),
+            BookingSlot.objects.count(),
+        )
+
+
+class AvailabilityTests(BusinessTestMixin, TestCase):
+    """Occupancy bitmaps over the 09:00-18:00 day of 15-minute slots"""
+
+    business_name = 'Barber'
+    business_type = 'booking'
+
+    def setUp(self):
+        super().setUp()
+        self.haircut = BusinessItem.objects.create(
+            business=self.business, item_type='service', name='Haircut', price=300,
+            duration_minutes=45,
+        )
+        self.shave = BusinessItem.objects.create(
+            business=self.business, item_type='service', name='Shave', price=150,
+            duration_minutes=20,
+        )
+        self.day = datetime(2030, 1, 15).date()
+        self.before = timezone.make_aware(datetime(2030, 1, 1, 12, 0))
+
+    def book(self, booking_time, *items, status='confirmed'):
+        booking = Booking.objects.create(
+            business=self.business, booking_type='appointment', customer_name='Customer',
+            customer_phone='+380111111111', booking_date=self.day, booking_time=booking_time,
+            status=status,
+        )
+        booking.selected_items.add(*items)
+        return booking
+
+    def free(self, duration_minutes, now=None):
+        slots = free_slots(self.business, duration_minutes, self.day, self.day, now=now or self.before)
+        return [t.strftime('%H:%M') for t in slots[self.day]]
+
+    def test_bookings_take_the_length_of_their_services(self):
+        self.book('10:00', self.haircut, self.shave)  # 65 minutes: slots 4-8
+        self.book('12:10', self.shave)  # starts mid-slot: slots 12-13
+        self.book('15:00', self.haircut, status='cancelled')
+
+        self.assertEqual(occupancy(self.business, self.day, self.day), {
+            self.day: (0b11111 << 4) | (0b11 << 12),
+        })
+
+    def test_a_service_only_fits_where_all_its_slots_are_free(self):
+        self.book('10:00', self.haircut)
+
+        free = self.free(45)
+
+        self.assertIn('09:15', free)
+        for taken in ('09:30', '09:45', '10:00', '10:30'):
+            self.assertNotIn(taken, free)
+        self.assertIn('10:45', free)
+        # A shorter service fits in the gap before the booking
+        self.assertIn('09:45', self.free(15))
+
+    def test_day_boundaries(self):
+        self.book('08:30', self.haircut)  # runs into the first slot
+        self.book('17:45', self.haircut)  # runs past the end of the day
+
+        self.assertEqual(occupancy(self.business, self.day, self.day), {
+            self.day: 1 | (1 << 35),
+        })
+        free = self.free(45)
+        self.assertEqual((free[0], free[-1]), ('09:15', '17:00'))
+
+        # Today: nothing at or before the slot in progress
+        now = timezone.make_aware(datetime(2030, 1, 15, 10, 5))
+        self.assertEqual(self.free(15, now=now)[0], '10:15')
+
+    def test_endpoint_cache_follows_bookings(self):
+        url = f'/{self.business.slug}/availability/?service={self.haircut.pk}&start=2030-01-15&days=1'
+
+        def times():
+            return self.client.get(url).json()['days']['2030-01-15']
+
+        self.assertIn('10:00', times())
+        with self.assertNumQueries(0):
+            times()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book('10:00', self.haircut)
+        self.assertNotIn('10:00', times())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'cancelled'
+            booking.save()
+        self.assertIn('10:00', times())
+
+
+class IdempotentBookingTests(BusinessTestMixin, TestCase):
+    """Retried submissions return the first response and write nothing"""
+
+    business_name = 'Shop'
+    business_type = 'shop'
+
+    def setUp(self):
+        super().setUp()
+        self.item = BusinessItem.objects.create(
+            business=self.business, item_type='product', name='Tea', price=150,
+        )
+        self.url = f'/{self.business.slug}/book/'
+
+    def book(self, key, **data):
+        data = {
+            'customer_name': 'Customer',
+            'customer_phone': '+380111111111',
+            'booking_date': '2030-01-15',
+            'selected_items': [self.item.id],
+            **data,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data, headers={'Idempotency-Key': key})
+
+    def test_retry_replays_the_first_response(self):
+        first = self.book('order-1')
+
+        with self.assertNumQueries(1):
+            retry = self.book('order-1')
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(AnalyticsEvent.objects.filter(event_type='booking').count(), 1)
+        totals = DailyStatistics.objects.aggregate(bookings=Sum('bookings'), revenue=Sum('revenue'))
+        self.assertEqual(totals, {'bookings': 1, 'revenue': 150})
+
+    def test_different_keys_make_different_bookings(self):
+        self.book('order-1')
+        self.book('order-2')
+
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.book('order-1')
+
+        response = self.book('order-1', customer_name='Someone else')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_failed_request_does_not_store_the_key(self):
+        self.assertEqual(self.book('order-1', booking_date='not-a-date').status_code, 400)
+
+        self.assertEqual(self.book('order-1').status_code, 200)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_key_is_purged_and_reusable(self):
+        self.book('order-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+
+        response = self.book('order-1')
+
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+@override_settings(STORAGES=PLAIN_STATIC_STORAGES)
+class ConcurrentRetryTests(BusinessTestMixin, TransactionTestCase):
+    """Stress test: the same submission sent several times at once"""
+
+    business_name = 'Shop'
+    business_type = 'shop'
+
+    CLIENTS = 8
+
+    def setUp(self):
+        super().setUp()
+        self.item = BusinessItem.objects.create(
+            business=self.business, item_type='product', name='Tea', price=150,
+        )
+
+    def test_one_booking_per_key(self):
+        barrier = threading.Barrier(self.CLIENTS)
+        responses = []
+
+        def submit():
+            client = Client(raise_request_exception=False)
+            try:
+                barrier.wait()
+                responses.append(client.post(f'/{self.business.slug}/book/', {
+                    'customer_name': 'Customer',
+                    'customer_phone': '+380111111111',
+                    'booking_date': '2030-01-15',
+                    'selected_items': [self.item.id],
+                }, headers={'Idempotency-Key': 'order-1'}))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(self.CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # One request books; every duplicate gets its response replayed,
+        # or a 409 if it came while that request was still in flight
+        booking = Booking.objects.get()
+        self.assertEqual(len(responses), self.CLIENTS)
+        originals = [r for r in responses if not r.has_header('Idempotent-Replayed')]
+        self.assertEqual([r.status_code for r in originals if r.status_code != 409], [200])
+        for response in responses:
+            with self.subTest(status=response.status_code):
+                self.assertIn(response.status_code, (200, 409))
+                if response.status_code == 200:
+                    self.assertEqual(response.json(), {'success': True, 'booking_id': booking.id})
+        self.assertEqual(IdempotencyKey.objects.get().booking, booking)
+
+
+class CatalogImportTests(BusinessTestMixin, TestCase):
+    """CSV/XLSX catalog import upserts by sku and reports bad rows"""
+
+    business_name = 'Shop'
+    business_type = 'shop'
+
+    def import_csv(self, text):
+        rows = read_rows(io.BytesIO(text.encode('utf-8')), 'csv')
+        return import_catalog(self.business, rows)
+
+    def test_csv_creates_then_updates_by_sku(self):
+        result = self.import_csv('sku,name,price\nA1,Tea,50\nB2,Coffee,70\n')
+        self.assertEqual((result.created, result.updated, result.failed), (2, 0, 0))
+
+        result = self.import_csv('SKU,Price,Name\nA1,55,Green tea\n')
+
+        self.assertEqual((result.created, result.updated), (0, 1))
+        tea = BusinessItem.objects.get(business=self.business, sku='A1')
+        self.assertEqual((tea.name, tea.price), ('Green tea', 55))
+        self.assertEqual(BusinessItem.objects.filter(business=self.business).count(), 2)
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        result = self.import_csv(
+            'sku,name,price,stock_quantity\n'
+            'A1,Tea,50,3\n'
+            'A2,,10,1\n'
+            'A3,Cake,cheap,1\n'
+            'A4,Pie,20,-1\n'
+        )
+
+        self.assertEqual((result.created, result.failed), (1, 3))
+        self.assertEqual([line for line, error in result.errors], [3, 4, 5])
+        self.assertIn('name: required', result.errors[0][1])
+        self.assertEqual(list(BusinessItem.objects.values_list('sku', flat=True)), ['A1'])
+
+    def test_booleans(self):
+        result = self.import_csv(
+            'sku,name,price,is_vegetarian,is_available\n'
+            'A1,Tea,1,TRUE,FALSE\n'
+            'A2,Cake,1,yes,no\n'
+            'A3,Pie,1,1,0\n'
+            'A4,Soup,1,Так,Ні\n'
+            'A5,Bun,1,maybe,true\n'
+        )
+
+        self.assertEqual((result.created, result.failed), (4, 1))
+        self.assertEqual(result.errors[0][0], 6)
+        flags = set(BusinessItem.objects.values_list('is_vegetarian', 'is_available'))
+        self.assertEqual(flags, {(True, False)})
+
+    @skipIf(openpyxl is None, "openpyxl is not installed")
+    def test_xlsx_round_trip(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['sku', 'name', 'price', 'is_available'])
+        sheet.append(['A1', 'Tea', 50, True])
+        sheet.append(['A2', 'Coffee', 70.5, False])
+        sheet.append(['A3', None, 1, True])
+        upload = io.BytesIO()
+        workbook.save(upload)
+        upload.seek(0)
+
+        result = import_catalog(self.business, read_rows(upload, 'xlsx'))
+
+        self.assertEqual((result.created, result.failed), (2, 1))
+        self.assertEqual(result.errors[0][0], 4)
+        coffee = BusinessItem.objects.get(sku='A2')
+        self.assertEqual((coffee.price, coffee.is_available), (Decimal('70.50'), False))
+
+        exported = openpyxl.load_workbook(write_catalog_xlsx(self.business)).active
+        self.assertEqual(exported.max_row, 3)
+
+    def test_csv_export_reimports_unchanged(self):
+        self.import_csv('sku,name,price,is_available\nA1,Чай,50,no\n')
+        exported = ''.join(iter_catalog_csv(self.business))
+
+        result = self.import_csv(exported)
+
+        self.assertEqual((result.created, result.updated, result.failed), (0, 1, 0))
+        tea = BusinessItem.objects.get(sku='A1')
+        self.assertEqual((tea.name, tea.is_available), ('Чай', False))
+
+
+class SlugAllocationTests(TestCase):
+    """Business slugs are '<base>' or '<base>-<n>', lowest free first"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='secret')
+
+    def create(self, name, **kwargs):
+        return Business.objects.create(
+            owner=self.owner, name=name, business_type='menu', phone='+380000000000', **kwargs,
+        )
+
+    def test_colliding_names_get_numbered(self):
+        slugs = [self.create('Coffee Lab').slug for _ in range(3)]
+
+        self.assertEqual(slugs, ['coffee-lab', 'coffee-lab-1', 'coffee-lab-2'])
+
+    def test_gaps_are_reused_and_lookalikes_ignored(self):
+        for slug in ('coffee-lab', 'coffee-lab-1', 'coffee-lab-3', 'coffee-lab-bar', 'coffee-lab-2x'):
+            self.create('Other', slug=slug)
+
+        self.assertEqual(taken_slugs('coffee-lab'), {'coffee-lab', 'coffee-lab-1', 'coffee-lab-3'})
+        self.assertEqual(
+            allocate_slugs(['Coffee Lab', 'Coffee Lab', 'Coffee Lab']),
+            ['coffee-lab-2', 'coffee-lab-4', 'coffee-lab-5'],
+        )
+
+    def test_long_names_are_cut_to_leave_room_for_a_suffix(self):
+        max_length = Business._meta.get_field('slug').max_length
+        name = 'Very ' * 20 + 'Long Name'
+
+        first, second = self.create(name), self.create(name)
+
+        self.assertLessEqual(len(base_slug(name)), max_length - 6)
+        self.assertFalse(first.slug.endswith('-'))
+        self.assertEqual(second.slug, f"{first.slug}-1")
+        self.assertLessEqual(len(second.slug), max_length)
+
+    def test_names_without_latin_letters(self):
+        self.assertEqual(self.create('Кав\'ярня').slug, 'business')
+        self.assertEqual(self.create('Кав\'ярня').slug, 'business-1')
+
+    def test_save_retries_when_a_concurrent_signup_takes_the_slug(self):
+        self.create('Coffee Lab')
+
+        # The first allocation loses the race for 'coffee-lab'
+        with mock.patch(
+            'businesses.provisioning.allocate_slugs',
+            side_effect=[['coffee-lab'], ['coffee-lab-1']],
+        ):
+            business = self.create('Coffee Lab')
+
+        self.assertEqual(business.slug, 'coffee-lab-1')
+
+    def test_provision_in_bulk(self):
+        self.create('Coffee Lab')
+        businesses = [
+            Business(owner=self.owner, name=name, business_type='menu', phone='+380000000000')
+            for name in ('Coffee Lab', 'Coffee Lab', 'Bakery', 'Bakery')
+        ]
+
+        # One slug lookup per distinct name, one insert (in a savepoint)
+        with self.assertNumQueries(2 + 3):
+            created = provision_businesses(businesses)
+
+        self.assertEqual(
+            [business.slug for business in created],
+            ['coffee-lab-1', 'coffee-lab-2', 'bakery', 'bakery-1'],
+        )
+
+
+class RollupTests(BusinessTestMixin, TestCase):
+    """Raw events are rolled up once and only pruned after being rolled up"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def add_events(self, n, age, event_type='visit'):
+        AnalyticsEvent.objects.bulk_create([
+            AnalyticsEvent(business=self.business, event_type=event_type, timestamp=self.now - age)
+            for _ in range(n)
+        ])
+
+    def hourly_total(self):
+        return HourlyStatistics.objects.aggregate(total=Sum('count'))['total'] or 0
+
+    def roll_up_all(self, chunk_size=5000):
+        total = 0
+        while n := rollup_chunk(chunk_size):
+            total += n
+        return total
+
+    def test_rerun_counts_nothing_twice(self):
+        self.add_events(5, timedelta(hours=2))
+        self.add_events(2, timedelta(hours=2), 'menu_view')
+
+        self.assertEqual(self.roll_up_all(chunk_size=3), 7)
+        self.assertEqual(self.roll_up_all(), 0)
+        call_command('rollup_events', '--no-prune', stdout=io.StringIO())
+
+        self.assertEqual(self.hourly_total(), 7)
+        self.assertEqual(
+            HourlyStatistics.objects.get(event_type='menu_view').count, 2,
+        )
+
+        # Only new events are added on the next run
+        self.add_events(3, timedelta(hours=2))
+        self.assertEqual(self.roll_up_all(), 3)
+        self.assertEqual(HourlyStatistics.objects.get(event_type='visit').count, 8)
+
+    def test_unsettled_events_wait_for_the_next_run(self):
+        self.add_events(2, timedelta(hours=1))
+        self.add_events(1, timedelta(seconds=10))
+        self.add_events(1, timedelta(hours=1))
+
+        # Stops at the first unsettled id, leaving the later old one too
+        self.assertEqual(self.roll_up_all(), 2)
+        self.assertEqual(AnalyticsEvent.objects.count(), 4)
+
+    def test_prune_only_removes_rolled_up_events(self):
+        self.add_events(3, timedelta(days=100))
+        self.roll_up_all()
+        # Old but not rolled up yet (e.g. written late by a buffer)
+        self.add_events(2, timedelta(days=100))
+        # Rolled up below, but inside the retention window
+        self.add_events(1, timedelta(days=1))
+        checkpoint = RollupCheckpoint.objects.get()
+
+        self.assertEqual(prune_chunk(retention_days=90, chunk_size=2), 2)
+        self.assertEqual(prune_chunk(retention_days=90, chunk_size=2), 1)
+        self.assertEqual(prune_chunk(retention_days=90), 0)
+
+        remaining = AnalyticsEvent.objects.order_by('id')
+        self.assertEqual(remaining.count(), 3)
+        self.assertTrue(all(event.id > checkpoint.last_event_id for event in remaining))
+
+    def test_prune_with_archive_keeps_the_pruned_rows(self):
+        self.add_events(4, timedelta(days=100))
+        self.add_events(1, timedelta(days=1))
+        day = (self.now - timedelta(days=100)).date()
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with override_settings(ANALYTICS_ARCHIVE_DIR=archive_dir):
+                call_command('rollup_events', '--archive', stdout=io.StringIO())
+                archived = list(iter_archived_events(self.business, day, day))
+
+        self.assertEqual(len(archived), 4)
+        self.assertEqual(self.hourly_total(), 5)
+        self.assertEqual(AnalyticsEvent.objects.count(), 1)
+        self.assertNotIn(AnalyticsEvent.objects.get().id, {record['id'] for record in archived})
+
+    def test_visits_are_merged_into_the_daily_sketch(self):
+        for session_id in ('a', 'b', 'a'):
+            AnalyticsEvent.objects.create(
+                business=self.business, event_type='visit', session_id=session_id,
+                timestamp=self.now - timedelta(hours=1),
+            )
+        day = (self.now - timedelta(hours=1)).date()
+
+        self.roll_up_all()
+        self.roll_up_all()
+
+        self.assertEqual(VisitorSketch.objects.get(business=self.business, date=day).sketch().count(), 2)
+        self.assertEqual(DailyStatistics.objects.get(business=self.business, date=day).unique_visitors, 2)
+
+
+class HeatmapTests(BusinessTestMixin, TestCase):
+    """Rolled-up and not yet rolled-up visits land in weekday/hour cells"""
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.now().date()
+        self.monday = today - timedelta(days=today.weekday() + 7)
+
+    def event(self, day, hour, event_type='visit', minute=30):
+        return AnalyticsEvent.objects.create(
+            business=self.business, event_type=event_type,
+            timestamp=timezone.make_aware(
+                datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+            ),
+        )
+
+    def test_empty_heatmap_is_seven_by_twenty_four(self):
+        matrix = calculate_hourly_heatmap(self.business)
+
+        self.assertEqual(len(matrix), 7)
+        self.assertEqual({len(row) for row in matrix}, {24})
+        self.assertEqual(sum(map(sum, matrix)), 0)
+
+    def test_rolled_up_and_recent_counts_are_bucketed(self):
+        HourlyStatistics.objects.create(
+            business=self.business, date=self.monday, hour=9, event_type='visit', count=4,
+        )
+        HourlyStatistics.objects.create(
+            business=self.business, date=self.monday + timedelta(days=6), hour=23, event_type='visit', count=2,
+        )
+        # Already in HourlyStatistics: below the checkpoint, not counted twice
+        rolled = self.event(self.monday, 9)
+        RollupCheckpoint.objects.create(name=CHECKPOINT_NAME, last_event_id=rolled.id)
+        self.event(self.monday + timedelta(days=2), 14, minute=0)
+        self.event(self.monday + timedelta(days=2), 14, minute=59)
+        self.event(self.monday + timedelta(days=2), 15, minute=0)
+        self.event(self.monday + timedelta(days=2), 14, event_type='qr_scan')
+        self.event(self.monday - timedelta(weeks=5), 14)  # before the window
+
+        matrix = calculate_hourly_heatmap(self.business, weeks=4)
+
+        self.assertEqual(matrix[0][9], 4)
+        self.assertEqual(matrix[6][23], 2)
+        self.assertEqual((matrix[2][14], matrix[2][15]), (2, 1))
+        self.assertEqual(sum(map(sum, matrix)), 9)
+
+
+class StatWindowTests(BusinessTestMixin, TestCase):
+    """Several date windows are summed in one query"""
+
+    def setUp(self):
+        super().setUp()
+        self.first = datetime(2030, 1, 1).date()
+        # visits = day of the month, revenue = 10x that
+        for offset in range(10):
+            DailyStatistics.objects.create(
+                business=self.business, date=self.first + timedelta(days=offset),
+                visits=offset + 1, revenue=10 * (offset + 1),
+            )
+        # A second shard of the 8th
+        DailyStatistics.objects.create(
+            business=self.business, date=self.first + timedelta(days=7), shard=1, visits=100,
+        )
+
+    def day(self, n):
+        return self.first + timedelta(days=n - 1)
+
+    def test_windows_are_summed_in_one_query(self):
+        windows = {
+            'early': (self.day(1), self.day(5)),
+            'touching': (self.day(5), self.day(7)),  # shares the 5th
+            'sharded': (self.day(8), self.day(8)),
+            'empty': (self.day(20), self.day(25)),
+        }
+
+        with self.assertNumQueries(1):
+            totals = aggregate_windows(self.business, windows, fields=('visits', 'revenue'))
+
+        self.assertEqual(totals, {
+            'early': {'visits': 15, 'revenue': 150},
+            'touching': {'visits': 18, 'revenue': 180},
+            'sharded': {'visits': 108, 'revenue': 80},
+            'empty': {'visits': 0, 'revenue': 0},
+        })
+
+    def test_comparison_periods_meet_without_overlapping(self):
+        windows = comparison_windows(days=3, today=self.day(10))
+
+        self.assertEqual(windows, {
+            'current': (self.day(7), self.day(10)),
+            'previous': (self.day(4), self.day(6)),
+        })
+        totals = aggregate_windows(self.business, windows, fields=('visits',))
+        self.assertEqual(totals['current']['visits'], 7 + 108 + 9 + 10)
+        self.assertEqual(totals['previous']['visits'], 4 + 5 + 6)
+
+
+class BotFilterTests(BusinessTestMixin, TestCase):
+    """Crawler page hits are counted as bot_hits and never stored"""
+
+    FIREFOX = 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0'
+    GOOGLEBOT = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+
+    def track(self, user_agent, event_type='visit'):
+        request = RequestFactory().get('/', HTTP_USER_AGENT=user_agent)
+        request.session = self.client.session
+        return track_event(self.business, event_type, request)
+
+    def counters(self):
+        return DailyStatistics.objects.aggregate(
+            visits=Sum('visits', default=0), bot_hits=Sum('bot_hits', default=0),
+        )
+
+    def test_bot_visit_is_only_counted(self):
+        self.assertIsNone(self.track(self.GOOGLEBOT))
+
+        self.assertFalse(AnalyticsEvent.objects.exists())
+        self.assertEqual(self.counters(), {'visits': 0, 'bot_hits': 1})
+
+    def test_human_visit_is_stored(self):
+        self.assertIsNotNone(self.track(self.FIREFOX))
+
+        self.assertEqual(AnalyticsEvent.objects.count(), 1)
+        self.assertEqual(self.counters(), {'visits': 1, 'bot_hits': 0})
+
+    def test_empty_user_agent_is_not_a_bot(self):
+        self.track('')
+
+        self.assertEqual(AnalyticsEvent.objects.count(), 1)
+        self.assertEqual(self.counters(), {'visits': 1, 'bot_hits': 0})
+
+    def test_only_page_events_are_filtered(self):
+        self.track(self.GOOGLEBOT, 'booking')
+
+        self.assertEqual(AnalyticsEvent.objects.get().event_type, 'booking')
+
+    def test_patterns_come_from_settings(self):
+        with override_settings(ANALYTICS_BOT_PATTERNS=[r'uptime-?monitor']):
+            self.assertTrue(is_bot('Uptime-Monitor/1.0'))
+            self.assertFalse(is_bot(self.GOOGLEBOT))
+        self.assertTrue(is_bot(self.GOOGLEBOT))
+
+
+class BeaconTests(BusinessTestMixin, TestCase):
+    """The public pages report their own analytics events"""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/{self.business.slug}/beacon/'
+
+    def send(self, payload, **headers):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(self.url, body, content_type='text/plain', **headers)
+
+    def test_events_are_recorded(self):
+        response = self.send({'events': [
+            {'type': 'visit'},
+            {'type': 'item_view', 'item_id': '12'},
+            {'type': 'booking'},  # not reportable by a page
+            {'type': 'item_view'},  # no item
+            'visit',
+        ]})
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            sorted(AnalyticsEvent.objects.values_list('event_type', 'metadata')),
+            [('item_view', {'item_id': 12}), ('visit', {})],
+        )
+
+    def test_bad_payloads_are_rejected(self):
+        for payload in ('not json', '[]', '{"events": {"type": "visit"}}'):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.send(payload).status_code, 400)
+        self.assertFalse(AnalyticsEvent.objects.exists())
+
+    def test_events_are_capped(self):
+        self.send({'events': [{'type': 'visit'}] * (MAX_BEACON_EVENTS + 10)})
+
+        self.assertEqual(AnalyticsEvent.objects.count(), MAX_BEACON_EVENTS)
+
+    def test_bot_beacons_are_only_counted(self):
+        response = self.send(
+            {'events': [{'type': 'visit'}, {'type': 'menu_view'}]},
+            HTTP_USER_AGENT=BotFilterTests.GOOGLEBOT,
+        )
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(AnalyticsEvent.objects.exists())
+        self.assertEqual(DailyStatistics.objects.aggregate(total=Sum('bot_hits'))['total'], 2)
+
+
+@override_settings(ANALYTICS_BUFFERED=True)
+class EventBufferTests(BusinessTestMixin, TransactionTestCase):
+    """Buffered events reach the database by size, by time and on shutdown"""
+
+    def use_buffer(self, **options):
+        buffer = EventBuffer(**options)
+        patcher = mock.patch('businesses.ingest._buffer', buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def wait_for_events(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while AnalyticsEvent.objects.count() < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return AnalyticsEvent.objects.count()
+
+    def visits(self):
+        return DailyStatistics.objects.aggregate(total=Sum('visits'))['total']
+
+    def test_full_batch_is_flushed(self):
+        buffer = self.use_buffer(batch_size=3, flush_interval=60)
+        buffer.start()
+
+        for _ in range(3):
+            track_event(self.business, 'visit')
+
+        self.assertEqual(self.wait_for_events(3), 3)
+        self.assertEqual(self.visits(), 3)
+
+    def test_partial_batch_is_flushed_after_the_interval(self):
+        buffer = self.use_buffer(batch_size=100, flush_interval=0.1)
+        buffer.start()
+
+        track_event(self.business, 'visit')
+
+        self.assertEqual(self.wait_for_events(1), 1)
+
+    def test_queue_is_drained_on_stop(self):
+        buffer = self.use_buffer(batch_size=100, flush_interval=60)
+        buffer.start()
+        track_event(self.business, 'visit')
+        track_event(self.business, 'qr_scan')
+        self.assertEqual(AnalyticsEvent.objects.count(), 0)
+
+        buffer.stop()
+
+        self.assertEqual(AnalyticsEvent.objects.count(), 2)
+
+    def test_failed_batch_is_written_by_the_next_flush(self):
+        buffer = self.use_buffer(batch_size=100)
+        track_event(self.business, 'visit')
+        track_event(self.business, 'visit')
+
+        with mock.patch('businesses.counters.incr_many', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            buffer.flush()
+        # Rolled back as a whole
+        self.assertEqual(AnalyticsEvent.objects.count(), 0)
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(AnalyticsEvent.objects.count(), 2)
+        self.assertEqual(self.visits(), 2)
+
+    def test_batch_failing_twice_is_dropped_and_logged(self):
+        buffer = self.use_buffer(batch_size=100)
+        track_event(self.business, 'visit')
+
+        with mock.patch('businesses.counters.incr_many', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+            with self.assertLogs('businesses.ingest', 'ERROR') as logs, self.assertRaises(RuntimeError):
+                buffer.flush()
+
+        self.assertIn('Dropped 1 analytics events', logs.output[0])
+        self.assertEqual(buffer.flush(), 0)
+
+
+class VisitTrackingTests(BusinessTestMixin, TestCase):
+    """Visitor sketches are only rewritten per batch, never per event"""
+
+    def test_sync_visit_does_not_rewrite_the_visitor_sketch(self):
+        request = RequestFactory().get('/', HTTP_USER_AGENT='Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0')
+        request.session = self.client.session
+        track_event(self.business, 'visit', request)
+
+        # Event insert and the day's visit counter
+        with self.assertNumQueries(2):
+            track_event(self.business, 'visit', request)
+
+        self.assertFalse(VisitorSketch.objects.exists())
+
+    def test_buffered_flush_merges_the_batch(self):
+        buffer = EventBuffer()
+        for session_id in ('a', 'b', 'c', 'a'):
+            buffer.add(AnalyticsEvent(business=self.business, event_type='visit', session_id=session_id))
+
+        buffer.flush()
+
+        self.assertEqual(VisitorSketch.objects.get().sketch().count(), 3)
+        self.assertEqual(DailyStatistics.objects.get().unique_visitors, 3)
+
+
+class ArchiveReaderTests(TestCase):
+    """The archive reader returns each archived event exactly once"""
+
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        override = override_settings(ANALYTICS_ARCHIVE_DIR=self.archive_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def row(self, event_id, day):
+        return {
+            'id': event_id, 'business_id': 1, 'event_type': 'visit', 'session_id': '',
+            'ip_address': None, 'user_agent': '', 'metadata': {},
+            'timestamp': timezone.make_aware(datetime(2025, 3, day, 12)),
+        }
+
+    def read(self):
+        start, end = datetime(2025, 3, 1).date(), datetime(2025, 3, 31).date()
+        return sorted(record['id'] for record in iter_archived_events(1, start, end))
+
+    def test_rows_written_twice_are_read_once(self):
+        rows = [self.row(1, 1), self.row(2, 2)]
+        write_events(rows)
+        # An interrupted run writes the same rows again
+        write_events(rows)
+
+        self.assertEqual(self.read(), [1, 2])
+
+    def test_lower_ids_appended_later_are_kept(self):
+        # A run archives id 11, the next one a lower id of the same month
+        write_events([self.row(11, 5)])
+        write_events([self.row(10, 20), self.row(12, 21)])
+
+        self.assertEqual(self.read(), [10, 11, 12])
+
+
+class ImageVariantTests(BusinessTestMixin, TestCase):
+    """Uploads get WebP/JPEG variants that follow the upload's lifetime"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name, IMAGE_PROCESSING_ASYNC=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def photo(self, width, height, color=(200, 100, 50), orientation=None):
+        image = Image.new('RGB', (width, height), color)
+        exif = image.getexif()
+        if orientation:
+            exif[ExifTags.Base.Orientation] = orientation
+        output = io.BytesIO()
+        image.save(output, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', output.getvalue(), content_type='image/jpeg')
+
+    def create_item(self, image, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = BusinessItem.objects.create(
+                business=self.business, item_type='product', name='Tea', price=50, image=image, **fields,
+            )
+        item.refresh_from_db()
+        return item
+
+    def replace_image(self, item, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            item.image = image
+            item.save()
+        item.refresh_from_db()
+
+    def files(self, item):
+        return [variant['name'] for variant in item.image_variants['variants']]
+
+    def exists(self, names):
+        return [default_storage.exists(name) for name in names]
+
+    def test_variants_are_generated_at_each_width(self):
+        item = self.create_item(self.photo(1500, 1000))
+
+        metadata = item.image_variants
+        self.assertEqual((metadata['width'], metadata['height']), (1500, 1000))
+        self.assertEqual(
+            sorted((v['width'], v['height'], v['format']) for v in metadata['variants']),
+            [(w, h, fmt) for w, h in ((320, 213), (640, 427), (1280, 853)) for fmt in ('jpeg', 'webp')],
+        )
+        self.assertTrue(all(self.exists(self.files(item))))
+
+    def test_size_is_read_before_the_decoder_downscales(self):
+        item = self.create_item(self.photo(2800, 2800))
+
+        self.assertEqual(item.image_variants['width'], 2800)
+        self.assertEqual(variants_for(item, 'image', 'jpeg')[-1]['width'], 1280)
+
+    def test_small_rotated_photo_keeps_its_upright_size(self):
+        item = self.create_item(self.photo(300, 200, orientation=6))
+
+        self.assertEqual((item.image_variants['width'], item.image_variants['height']), (200, 300))
+        self.assertEqual(
+            [(v['width'], v['height']) for v in variants_for(item, 'image', 'jpeg')],
+            [(200, 300)],
+        )
+
+    def test_replaced_upload_deletes_its_variants(self):
+        item = self.create_item(self.photo(700, 500))
+        old = self.files(item)
+
+        self.replace_image(item, self.photo(700, 500, color=(10, 20, 30)))
+
+        self.assertFalse(any(self.exists(old)))
+        self.assertTrue(all(self.exists(self.files(item))))
+
+    def test_variants_shared_with_another_image_are_kept(self):
+        item = self.create_item(self.photo(700, 500))
+        twin = self.create_item(self.photo(700, 500))
+        self.assertEqual(self.files(item), self.files(twin))
+
+        self.replace_image(item, self.photo(700, 500, color=(10, 20, 30)))
+
+        self.assertTrue(all(self.exists(self.files(twin))))
+
+    def test_removed_upload_deletes_its_variants(self):
+        item = self.create_item(self.photo(700, 500))
+        old = self.files(item)
+
+        self.replace_image(item, '')
+
+        self.assertEqual(item.image_variants, {})
+        self.assertFalse(any(self.exists(old)))
+
+    def render(self, source, item):
+        return Template('{% load responsive_images %}' + source).render(Context({'item': item}))
+
+    def test_tag_falls_back_to_the_upload(self):
+        # Not processed: on_commit never runs inside the test transaction
+        item = BusinessItem.objects.create(
+            business=self.business, item_type='product', name='Tea', price=50, image=self.photo(700, 500),
+        )
+
+        html = self.render("{% responsive_image item 'image' alt='Tea' %}", item)
+
+        self.assertEqual(html, f'<img src="{item.image.url}" alt="Tea" loading="lazy">')
+        self.assertEqual(self.render("{{ item|srcset:'image' }}", item), '')
+
+    def test_tag_renders_the_variants(self):
+        item = self.create_item(self.photo(1500, 1000))
+        jpeg = variants_for(item, 'image', 'jpeg')
+
+        html = self.render("{% responsive_image item 'image' sizes='50vw' alt='Tea' %}", item)
+
+        self.assertIn('<picture><source type="image/webp" srcset="', html)
+        self.assertIn(f'src="{default_storage.url(jpeg[-1]["name"])}"', html)
+        self.assertIn('width="1280" height="853"', html)
+        self.assertEqual(
+            self.render("{{ item|srcset:'image' }}", item),
+            ', '.join(f"{default_storage.url(v['name'])} {v['width']}w" for v in jpeg),
+        )
+
+    def test_tag_renders_nothing_without_an_image(self):
+        item = BusinessItem.objects.create(business=self.business, item_type='product', name='Tea', price=50)
+
+        self.assertEqual(self.render("{% responsive_image item 'image' %}", item), '')
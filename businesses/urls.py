@@ -8,6 +8,10 @@ urlpatterns = [
     # Business websites - this handles yourdomain.com/business-name/
     path('<slug:business_slug>/', views.business_website_view, name='website'),
     
+    # Analytics beacon (navigator.sendBeacon from the public pages)
+    path('<slug:business_slug>/beacon/', views.track_beacon, name='beacon'),
+    
     # Booking endpoints
     path('<slug:business_slug>/book/', views.create_booking, name='create_booking'),
+    path('<slug:business_slug>/availability/', views.availability, name='availability'),
 ]
\ No newline at end of file
@@ -0,0 +1,160 @@
+# businesses/useragents.py
+"""
+User agent dictionary
+
+AnalyticsEvent rows point at a shared UserAgent row instead of storing the
+full string. resolve_user_agent() maps a string to its row id through a
+per-process LRU, so repeat visitors cost no query at ingest time.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+
+TABLET_RE = re.compile(r'ipad|tablet|kindle|silk|(android(?!.*mobile))', re.IGNORECASE)
+MOBILE_RE = re.compile(r'mobi|iphone|ipod|android|windows phone', re.IGNORECASE)
+
+# Order matters: Edge and Opera also claim to be Chrome, Chrome claims Safari
+BROWSERS = (
+    ('Edge', re.compile(r'edg(e|a|ios)?/', re.IGNORECASE)),
+    ('Opera', re.compile(r'opr/|opera', re.IGNORECASE)),
+    ('Samsung Internet', re.compile(r'samsungbrowser', re.IGNORECASE)),
+    ('Firefox', re.compile(r'firefox|fxios', re.IGNORECASE)),
+    ('Chrome', re.compile(r'chrome|crios', re.IGNORECASE)),
+    ('Safari', re.compile(r'safari', re.IGNORECASE)),
+)
+
+OPERATING_SYSTEMS = (
+    ('iOS', re.compile(r'iphone|ipad|ipod', re.IGNORECASE)),
+    ('Android', re.compile(r'android', re.IGNORECASE)),
+    ('Windows', re.compile(r'windows', re.IGNORECASE)),
+    ('macOS', re.compile(r'mac os x|macintosh', re.IGNORECASE)),
+    ('Linux', re.compile(r'linux', re.IGNORECASE)),
+)
+
+
+@lru_cache(maxsize=1)
+def _bot_re():
+    """All ANALYTICS_BOT_PATTERNS compiled into one case-insensitive regex"""
+    patterns = settings.ANALYTICS_BOT_PATTERNS
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def is_bot(user_agent):
+    """True if the user agent matches one of ANALYTICS_BOT_PATTERNS"""
+    if not user_agent:
+        return False
+    pattern = _bot_re()
+    return bool(pattern and pattern.search(user_agent))
+
+
+@receiver(setting_changed)
+def _reset_bot_patterns(setting, **kwargs):
+    if setting == 'ANALYTICS_BOT_PATTERNS':
+        _bot_re.cache_clear()
+        is_bot.cache_clear()
+
+
+def user_agent_hash(user_agent):
+    return hashlib.sha1(user_agent.encode('utf-8')).hexdigest()
+
+
+def parse_user_agent(user_agent):
+    """
+    Classify a user agent string
+
+    Returns:
+        dict with device_type, browser, os and is_bot
+    """
+    bot = is_bot(user_agent)
+
+    if bot:
+        device_type = 'bot'
+    elif TABLET_RE.search(user_agent):
+        device_type = 'tablet'
+    elif MOBILE_RE.search(user_agent):
+        device_type = 'mobile'
+    elif user_agent:
+        device_type = 'desktop'
+    else:
+        device_type = 'other'
+
+    browser = next((name for name, pattern in BROWSERS if pattern.search(user_agent)), '')
+    os_name = next((name for name, pattern in OPERATING_SYSTEMS if pattern.search(user_agent)), '')
+
+    return {
+        'device_type': device_type,
+        'browser': browser,
+        'os': os_name,
+        'is_bot': bot,
+    }
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_cache = LRUCache(getattr(settings, 'USER_AGENT_CACHE_SIZE', 2048))
+
+
+def resolve_user_agent(user_agent):
+    """Return the UserAgent id for a string, creating the row on first sight"""
+    from businesses.models import UserAgent
+
+    if not user_agent:
+        return None
+
+    ua_hash = user_agent_hash(user_agent)
+    agent_id = _cache.get(ua_hash)
+    if agent_id is not None:
+        return agent_id
+
+    agent_id = UserAgent.objects.filter(ua_hash=ua_hash).values_list('id', flat=True).first()
+    if agent_id is None:
+        try:
+            with transaction.atomic():
+                agent_id = UserAgent.objects.create(
+                    ua_hash=ua_hash, user_agent=user_agent, **parse_user_agent(user_agent)
+                ).id
+        except IntegrityError:
+            # Created by another worker in the meantime
+            agent_id = UserAgent.objects.get(ua_hash=ua_hash).id
+
+    _cache.set(ua_hash, agent_id)
+    return agent_id
@@ -1,7 +1,8 @@
 # businesses/utils.py
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Sum
+from datetime import datetime, timedelta
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay
 
 
 def get_client_ip(request):
@@ -13,107 +14,152 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip  # Just return the IP string, not HttpResponse
 
+# PostgreSQL lock_not_available, deadlock_detected, serialization_failure
+LOCK_SQLSTATES = ('55P03', '40P01', '40001')
+
+def is_lock_error(error):
+    """Whether an OperationalError is lock contention rather than a broken database"""
+    cause = error.__cause__
+    sqlstate = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    if sqlstate:
+        return sqlstate in LOCK_SQLSTATES
+    # SQLite: "database is locked" / "database table is locked"
+    return 'locked' in str(error)
+
+# Events that describe a page view (as opposed to bookings/orders)
+PAGE_EVENT_TYPES = ('visit', 'qr_scan', 'menu_view', 'item_view')
+
 def track_event(business, event_type, request=None, metadata=None):
     """
     Track an analytics event
     
+    With ANALYTICS_BUFFERED on, the event is queued and written in a batch
+    by the background flusher; otherwise it is written synchronously.
+    Page events from bots (ANALYTICS_BOT_PATTERNS) only bump the day's
+    bot_hits counter and return None.
+    
     Usage:
         track_event(business, 'qr_scan', request)
         track_event(business, 'menu_view', request, {'item_id': 123})
     """
     from businesses.models import AnalyticsEvent  # Import here to avoid circular imports
+    from businesses.counters import incr
+    from businesses.ingest import get_event_buffer, is_buffered
+    from businesses.useragents import is_bot, resolve_user_agent
     
     # Get session and IP info if request is provided
-    session_id = None
+    session_id = ''
     ip_address = None
-    user_agent = ''
+    agent_id = None
     
     if request:
-        session_id = request.session.session_key
-        ip_address = get_client_ip(request)
         user_agent = request.META.get('HTTP_USER_AGENT', '')
+        
+        # Crawlers and link previews only get counted, never stored
+        if event_type in PAGE_EVENT_TYPES and is_bot(user_agent):
+            if is_buffered():
+                get_event_buffer().add_bot_hit(business.pk)
+            else:
+                incr(business, timezone.now().date(), 'bot_hits')
+            return None
+        
+        session_id = request.session.session_key or ''
+        ip_address = get_client_ip(request)
+        agent_id = resolve_user_agent(user_agent)
     
-    # Create the event
-    event = AnalyticsEvent.objects.create(
+    event = AnalyticsEvent(
         business=business,
         event_type=event_type,
         session_id=session_id,
         ip_address=ip_address,
-        user_agent=user_agent,
+        agent_id=agent_id,
         metadata=metadata or {}
     )
     
-    # Update daily statistics
+    if is_buffered():
+        get_event_buffer().add(event)
+        return event
+    
+    # Synchronous fallback (tests, management commands); unique visitors
+    # are merged later, per batch, by rollup_events
+    event.save()
     update_daily_stats(business, event_type)
     
     return event
 
-def update_daily_stats(business, event_type=None):
-    """Update today's daily statistics"""
-    from businesses.models import DailyStatistics
-    
-    today = timezone.now().date()
+def update_daily_stats(business, event_type=None, amount=1, date=None):
+    """Add `amount` to the daily counter fed by `event_type`"""
+    from businesses.counters import EVENT_COUNTER_FIELDS, incr
     
-    # Get or create today's stats record
-    daily_stat, created = DailyStatistics.objects.get_or_create(
-        business=business,
-        date=today
-    )
+    field = EVENT_COUNTER_FIELDS.get(event_type)
+    if field:
+        incr(business, date or timezone.now().date(), field, amount)
 
-    if event_type == 'visit':
-        daily_stat.visits += 1
-    elif event_type == 'qr_scan':
-        daily_stat.qr_scans += 1
-    elif event_type == 'menu_view':
-        daily_stat.menu_views += 1
-    elif event_type == 'order':
-        daily_stat.orders += 1
-    elif event_type == 'booking':
-        daily_stat.bookings += 1
-    
-    daily_stat.save()
-    return daily_stat
+# DailyStatistics counters reported on the dashboard
+STAT_FIELDS = ('visits', 'qr_scans', 'menu_views', 'orders', 'bookings', 'revenue')
 
-def calculate_period_stats(business, days=7):
+def period_window(days, today=None):
+    """(start, end) dates covering the last N days, as the dashboard counts them"""
+    today = today or timezone.now().date()
+    return (today - timedelta(days=days), today)
+
+def comparison_windows(days=7, today=None):
+    """Current period and the previous period of the same length"""
+    current_start, today = period_window(days, today)
+    return {
+        'current': (current_start, today),
+        'previous': (current_start - timedelta(days=days), current_start - timedelta(days=1)),
+    }
+
+def aggregate_windows(business, windows, fields=STAT_FIELDS):
     """
-    Calculate statistics for the last N days
+    Sum DailyStatistics over several date windows in a single query
+    
+    Each window becomes a set of conditional Sum(..., filter=Q(date range))
+    aggregates over one scan of the business's rows.
     
     Args:
         business: Business instance
-        days: Number of days to look back (default 7)
+        windows: dict of {name: (start_date, end_date)}, both inclusive
+        fields: counters to sum
     
     Returns:
-        dict with aggregated statistics
+        dict of {name: {field: total}}
     """
     from businesses.models import DailyStatistics
     
-    today = timezone.now().date()
-    start_date = today - timedelta(days=days)
+    if not windows:
+        return {}
+    
+    aggregates = {}
+    for name, (start, end) in windows.items():
+        in_window = Q(date__gte=start, date__lte=end)
+        for field in fields:
+            aggregates[f'{name}__{field}'] = Sum(field, filter=in_window, default=0)
     
-    # Get daily stats for this period
-    daily_stats = DailyStatistics.objects.filter(
+    totals = DailyStatistics.objects.filter(
         business=business,
-        date__gte=start_date,
-        date__lte=today
-    )
+        date__gte=min(start for start, end in windows.values()),
+        date__lte=max(end for start, end in windows.values()),
+    ).aggregate(**aggregates)
     
-    stats = daily_stats.aggregate(
-        # Write your aggregate fields here
-        visits=Sum('visits'),
-        qr_scans=Sum('qr_scans'),
-        menu_views=Sum('menu_views'),
-        orders=Sum('orders'),
-        bookings=Sum('bookings'),
-        revenue=Sum('revenue'),
+    return {
+        name: {field: totals[f'{name}__{field}'] for field in fields}
+        for name in windows
+    }
 
-    )
+def calculate_period_stats(business, days=7):
+    """
+    Calculate statistics for the last N days
     
-    # Replace None with 0 for all fields
-    for key in stats:
-        if stats[key] is None:
-            stats[key] = 0
+    Args:
+        business: Business instance
+        days: Number of days to look back (default 7)
     
-    return stats
+    Returns:
+        dict with aggregated statistics
+    """
+    return aggregate_windows(business, {'period': period_window(days)})['period']
 
 def calculate_comparison_stats(business, days=7):
     """
@@ -122,44 +168,69 @@ def calculate_comparison_stats(business, days=7):
     Returns:
         dict with current, previous, change_percent, and is_positive
     """
-    from businesses.models import DailyStatistics
+    windows = comparison_windows(days)
+    return build_comparison(business, windows, aggregate_windows(business, windows))
+
+def calculate_dashboard_stats(business, days=7):
+    """
+    Comparison, today's and this week's stats from one aggregate query
     
+    Returns:
+        (comparison_stats, today_stats, week_stats) shaped like
+        calculate_comparison_stats and calculate_period_stats
+    """
+    windows = comparison_windows(days)
+    windows['today'] = period_window(1)
+    windows['week'] = period_window(7)
+    
+    totals = aggregate_windows(business, windows)
+    comparison = build_comparison(business, windows, totals)
+    return comparison, totals['today'], totals['week']
+
+def calculate_appointment_stats(business):
+    """
+    Appointments scheduled for today and the coming week
+    
+    Returns:
+        dict with 'today' and 'week' counts
+    """
     today = timezone.now().date()
+    totals = aggregate_windows(business, {
+        'today': (today, today),
+        'week': (today, today + timedelta(days=6)),
+    }, fields=('appointments',))
+    return {name: window['appointments'] for name, window in totals.items()}
+
+def calculate_total_stats(business):
+    """
+    All-time totals, summed over the business's daily counter rows
     
-    # Current period
-    current_start = today - timedelta(days=days)
-    current_stats = DailyStatistics.objects.filter(
-        business=business,
-        date__gte=current_start,
-        date__lte=today
-    ).aggregate(
-        visits=Sum('visits'),
-        qr_scans=Sum('qr_scans'),
-        menu_views=Sum('menu_views'),
-        orders=Sum('orders'),
-        revenue=Sum('revenue'),
-    )
+    Nothing writes the Statistics totals on the hot path, so readers get
+    them from here (rebuild_statistics stores a snapshot of the same sums).
     
-    # Previous period (same length, just before current period)
-    previous_start = current_start - timedelta(days=days)
-    previous_end = current_start - timedelta(days=1)
+    Returns:
+        dict of {Statistics field: total}, including average_order_value
+    """
+    from businesses.counters import TOTAL_FIELDS
+    from businesses.models import DailyStatistics
     
-    # Your turn: Write the query for previous_stats
-    # It should be similar to current_stats but with different date range
-    # Use date__gte=previous_start and date__lte=previous_end
-    previous_stats = DailyStatistics.objects.filter(
-        business=business,
-        date__gte=previous_start,
-        date__lte=previous_end
-        # Write your filter here
-    ).aggregate(
-        visits=Sum('visits'),
-        qr_scans=Sum('qr_scans'),
-        menu_views=Sum('menu_views'),
-        orders=Sum('orders'),
-        revenue=Sum('revenue'),
-        # Write your aggregate here (same as current_stats)
-    )
+    totals = DailyStatistics.objects.filter(business=business).aggregate(**{
+        total: Sum(counter, default=0) for counter, total in TOTAL_FIELDS.items()
+    })
+    orders = totals['total_orders']
+    totals['average_order_value'] = round(totals['total_revenue'] / orders, 2) if orders else 0
+    return totals
+
+def build_comparison(business, windows, totals):
+    """Turn 'current'/'previous' window totals into change percentages"""
+    from businesses.visitors import unique_visitors
+    
+    current_stats = dict(totals['current'])
+    previous_stats = dict(totals['previous'])
+    
+    # Uniques can't be summed over days - merge the daily sketches instead
+    current_stats['unique_visitors'] = unique_visitors(business, *windows['current'])
+    previous_stats['unique_visitors'] = unique_visitors(business, *windows['previous'])
     
     # Calculate changes
     changes = {}
@@ -167,7 +238,6 @@ def calculate_comparison_stats(business, days=7):
         current = current_stats[key] or 0
         previous = previous_stats[key] or 0
         
-        # Your turn: Calculate the percentage change
         # Formula: ((current - previous) / previous) * 100
         # Handle the case when previous is 0
         if previous > 0:
@@ -182,4 +252,89 @@ def calculate_comparison_stats(business, days=7):
             'is_positive': change_percent >= 0
         }
     
-    return changes
\ No newline at end of file
+    return changes
+
+def calculate_hourly_heatmap(business, weeks=4, event_type='visit'):
+    """
+    Weekday/hour activity heatmap for the last N weeks
+    
+    Reads HourlyStatistics (filled by `manage.py rollup_events`) plus the
+    raw events the rollup hasn't reached yet, both grouped in the database,
+    so at most a few hundred rows come back.
+    
+    Returns:
+        7x24 list of counts, matrix[weekday][hour] with Monday = 0
+    """
+    from businesses.models import AnalyticsEvent, HourlyStatistics, RollupCheckpoint
+    from businesses.rollup import CHECKPOINT_NAME
+    
+    start_date = timezone.now().date() - timedelta(weeks=weeks)
+    start = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    matrix = [[0] * 24 for _ in range(7)]
+    
+    rolled_up = HourlyStatistics.objects.filter(
+        business=business,
+        event_type=event_type,
+        date__gte=start_date,
+    ).annotate(
+        weekday=ExtractWeekDay('date'),
+    ).order_by().values('weekday', 'hour').annotate(n=Sum('count'))
+    
+    checkpoint = RollupCheckpoint.objects.filter(name=CHECKPOINT_NAME).values_list(
+        'last_event_id', flat=True
+    ).first() or 0
+    
+    recent = AnalyticsEvent.objects.filter(
+        business=business,
+        event_type=event_type,
+        timestamp__gte=start,
+        id__gt=checkpoint,
+    ).annotate(
+        weekday=ExtractWeekDay('timestamp'),
+        hour=ExtractHour('timestamp'),
+    ).order_by().values('weekday', 'hour').annotate(n=Count('id'))
+    
+    for row in list(rolled_up) + list(recent):
+        # ExtractWeekDay counts from Sunday = 1
+        matrix[(row['weekday'] + 5) % 7][row['hour']] += row['n']
+    
+    return matrix
+
+# Context names of the per-type item lists on the public site
+ITEM_TYPE_CONTEXT_NAMES = {
+    'menu_item': 'menu_items',
+    'product': 'products',
+    'service': 'services',
+}
+
+def load_site_items(business):
+    """
+    Load a business's active items with one query and partition them in Python
+    
+    Items keep BusinessItem.Meta.ordering within every partition.
+    
+    Returns:
+        dict with 'items', 'menu_items', 'products', 'services' (lists) and
+        'categories' ({category: [items]} in order of first appearance)
+    """
+    from businesses.models import BusinessItem
+    
+    items = list(
+        BusinessItem.objects.filter(business=business, is_active=True)
+        .order_by(*BusinessItem._meta.ordering)
+    )
+    
+    context = {name: [] for name in ITEM_TYPE_CONTEXT_NAMES.values()}
+    categories = {}
+    for item in items:
+        # The page only shows the business's own items; keep the
+        # reverse relation from costing a query per item
+        item.business = business
+        name = ITEM_TYPE_CONTEXT_NAMES.get(item.item_type)
+        if name:
+            context[name].append(item)
+        categories.setdefault(item.category, []).append(item)
+    
+    context['items'] = items
+    context['categories'] = categories
+    return context
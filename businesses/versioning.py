@@ -0,0 +1,50 @@
+# businesses/versioning.py
+"""
+Per-business data version stamps
+
+Cached views build their keys from a version stamp kept in the shared
+cache. Writes bump the stamp instead of deleting cached entries, so every
+worker sees the change on its next read and stale entries simply expire.
+
+Scopes:
+    'dashboard' - anything shown on the owner's dashboard (stats, items, bookings)
+    'site'      - the public website (business details and items)
+    'resolver'  - slug lookups; one stamp for all businesses (see resolver.py)
+    'bookings'  - booking calendar (availability)
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_TIMEOUT = None  # never expire on their own
+
+
+def _key(scope, business_id):
+    return f"version:{scope}:{business_id}"
+
+
+def _fresh_version():
+    # Larger than any stamp issued before, so a stamp lost to eviction
+    # can never come back and match old cache entries
+    return time.time_ns() // 1000
+
+
+def get_version(scope, business):
+    business_id = getattr(business, 'pk', business)
+    key = _key(scope, business_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope, business):
+    business_id = getattr(business, 'pk', business)
+    key = _key(scope, business_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, VERSION_TIMEOUT)
+        return version
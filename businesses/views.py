@@ -1,18 +1,42 @@
 # businesses/views.py  
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from .models import Business, BusinessItem, Booking
-from businesses.utils import track_event  # ADD THIS LINE
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, transaction
+from django.db.models import Count, Sum
+from django.shortcuts import render
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from .models import BusinessItem, Booking
+from businesses.utils import is_lock_error, load_site_items, track_event
+from businesses.availability import SlotUnavailable, free_slots, slot_index
+from businesses.idempotency import (
+    DuplicateRequest, InvalidKey, find_key, get_key, replay, request_hash, store_key,
+)
+from businesses.pagecache import cache_page, get_cached_page
+from businesses.resolver import get_business_or_404
+from businesses.versioning import get_version
 
 def business_website_view(request, business_slug):
     """Serve dynamic business websites"""
-    business = get_object_or_404(Business, slug=business_slug, is_active=True)
+    if request.method in ('GET', 'HEAD'):
+        content = get_cached_page(business_slug)
+        if content is not None:
+            response = HttpResponse(content)
+            response['X-Page-Cache'] = 'hit'
+            return response
     
-    # ADD THIS LINE - Track the visit
-    track_event(business, 'visit', request)
+    business = get_business_or_404(business_slug)
+    version = get_version('site', business)
     
-    # Get items based on business type
-    items = business.items.filter(is_active=True).order_by('display_order', 'name')
+    # The visit is reported by the page itself through the beacon endpoint
+    # (static/js/main.js), keeping analytics writes off the render path
     
     # Select appropriate template based on business type
     template_map = {
@@ -26,62 +50,236 @@ def business_website_view(request, business_slug):
     
     template = template_map.get(business.business_type, 'businesses/default_site.html')
     
+    # All active items in one query, split by type and category in Python
     context = {
         'business': business,
-        'items': items,
-        'menu_items': items.filter(item_type='menu_item'),
-        'products': items.filter(item_type='product'), 
-        'services': items.filter(item_type='service'),
+        **load_site_items(business),
     }
     
-    return render(request, template, context)
+    response = render(request, template, context)
+    cache_page(business_slug, business.pk, version, response.content)
+    response['X-Page-Cache'] = 'miss'
+    return response
 
-def create_booking(request, business_slug):
-    """Handle booking creation"""
-    if request.method == 'POST':
-        business = get_object_or_404(Business, slug=business_slug)
-        
-        booking_type_map = {
-            'service': 'appointment', 
-            'restaurant': 'reservation',
-            'shop': 'order'
-        }
-        
-        booking = Booking.objects.create(
-            business=business,
-            booking_type=booking_type_map[business.business_type],
-            customer_name=request.POST['customer_name'],
-            customer_phone=request.POST['customer_phone'],
-            customer_email=request.POST.get('customer_email', ''),
-            booking_date=request.POST['booking_date'],
-            booking_time=request.POST.get('booking_time'),
-            party_size=request.POST.get('party_size'),
-            notes=request.POST.get('notes', '')
-        )
+# Event types a public page may report about itself
+BEACON_EVENT_TYPES = ('visit', 'menu_view', 'item_view', 'qr_scan')
+MAX_BEACON_EVENTS = 50
+
+@csrf_exempt
+@require_POST
+def track_beacon(request, business_slug):
+    """
+    Record analytics events sent by navigator.sendBeacon
+    
+    Body: {"events": [{"type": "visit"}, {"type": "item_view", "item_id": 12}]}
+    
+    With ANALYTICS_BUFFERED on (production) the events are only queued.
+    With it off (tests, dev) track_event writes each one before the 204,
+    so a full beacon costs MAX_BEACON_EVENTS inserts and counter updates.
+    """
+    business = get_business_or_404(business_slug)
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return HttpResponseBadRequest()
+    
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        return HttpResponseBadRequest()
+    
+    for event in events[:MAX_BEACON_EVENTS]:
+        if not isinstance(event, dict) or event.get('type') not in BEACON_EVENT_TYPES:
+            continue
         
-        # ADD THIS - Track the booking
-        track_event(business, 'booking', request, {
-            'booking_id': booking.id,
-            'booking_type': booking.booking_type
-        })
+        metadata = {}
+        if event['type'] == 'item_view':
+            try:
+                metadata['item_id'] = int(event.get('item_id'))
+            except (TypeError, ValueError):
+                continue
         
-        if 'selected_items' in request.POST:
-            item_ids = request.POST.getlist('selected_items')
-            booking.selected_items.set(item_ids)
-            total = sum(item.price for item in booking.selected_items.all())
-            booking.total_amount = total
+        track_event(business, event['type'], request, metadata)
+    
+    return HttpResponse(status=204)
+
+# Booking type created by each business type
+BOOKING_TYPES = {
+    'menu': 'reservation',
+    'shop': 'order',
+    'booking': 'appointment',
+}
+
+BOOKING_REQUIRED_FIELDS = ('customer_name', 'customer_phone', 'booking_date')
+
+def create_booking(request, business_slug):
+    """
+    Handle booking creation
+    
+    Everything is written in one transaction with a fixed number of
+    queries however many items are selected: one query validates the
+    items and sums their prices, one inserts the booking with its total,
+    one bulk-inserts the item links.
+    
+    Retries sent with the same Idempotency-Key header get the original
+    response back (see businesses/idempotency.py).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'})
+    
+    business = get_business_or_404(business_slug, active_only=False)
+    
+    try:
+        idempotency_key = get_key(request)
+    except InvalidKey:
+        return JsonResponse({'error': 'Invalid idempotency key'}, status=400)
+    if idempotency_key:
+        fingerprint = request_hash(request)
+        record = find_key(business, idempotency_key)
+        if record:
+            return replay(record, fingerprint)
+    
+    missing = [name for name in BOOKING_REQUIRED_FIELDS if not request.POST.get(name)]
+    if missing:
+        return JsonResponse({'error': f"Missing fields: {', '.join(missing)}"}, status=400)
+    
+    try:
+        item_ids = {int(item_id) for item_id in request.POST.getlist('selected_items')}
+        party_size = int(request.POST['party_size']) if request.POST.get('party_size') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    booking = Booking(
+        business=business,
+        booking_type=BOOKING_TYPES[business.business_type],
+        customer_name=request.POST['customer_name'],
+        customer_phone=request.POST['customer_phone'],
+        customer_email=request.POST.get('customer_email', ''),
+        booking_date=request.POST['booking_date'],
+        booking_time=request.POST.get('booking_time') or None,
+        party_size=party_size,
+        notes=request.POST.get('notes', ''),
+    )
+    try:
+        booking.clean_fields(exclude=['business', 'total_amount'])
+    except ValidationError as e:
+        return JsonResponse({'error': 'Invalid booking', 'fields': e.message_dict}, status=400)
+    
+    try:
+        with transaction.atomic():
+            # Validate the items against the business and price them in one query
+            items = BusinessItem.objects.filter(
+                business=business, is_active=True, id__in=item_ids,
+            ).aggregate(
+                count=Count('id'),
+                total=Sum('price', default=Decimal('0')),
+                duration=Sum('duration_minutes'),
+            )
+            if items['count'] != len(item_ids):
+                return JsonResponse({'error': 'Unknown items selected'}, status=400)
+            
+            booking.total_amount = items['total']
+            # The post_save signal claims the booking's slots, failing and
+            # rolling the booking back if another booking holds the time
+            booking._duration_minutes = items['duration']
             booking.save()
+            response_body = {'success': True, 'booking_id': booking.id}
+            if idempotency_key:
+                # A concurrent retry of this request fails here and replays ours
+                store_key(business, idempotency_key, fingerprint, booking, response_body)
+            
+            Through = Booking.selected_items.through
+            Through.objects.bulk_create([
+                Through(booking_id=booking.id, businessitem_id=item_id) for item_id in item_ids
+            ])
+            
+            # Logged once the booking is committed; the booking itself and
+            # its revenue are counted by the Booking post_save signal
+            transaction.on_commit(lambda: track_event(business, 'booking', request, {
+                'booking_id': booking.id,
+                'booking_type': booking.booking_type,
+            }))
+    except SlotUnavailable:
+        # A concurrent retry of a request that took this time replays it
+        record = idempotency_key and find_key(business, idempotency_key)
+        if record:
+            return replay(record, fingerprint)
+        return JsonResponse({'error': 'This time is no longer available'}, status=409)
+    except OperationalError as e:
+        # Timed out waiting for a concurrent booking's locks: nothing was
+        # written, and the client may retry
+        if not is_lock_error(e):
+            raise
+        response = JsonResponse({'error': 'Too many bookings at once, please retry'}, status=503)
+        response['Retry-After'] = '1'
+        return response
+    except DuplicateRequest:
+        record = find_key(business, idempotency_key)
+        if record:
+            return replay(record, fingerprint)
+        return JsonResponse({'error': 'A request with this key is in progress'}, status=409)
+    
+    # Trigger Telegram notification
+    # from telegram_bot.utils import send_booking_notification
+    # send_booking_notification(booking)
+    
+    return JsonResponse(response_body)
 
-            # Trigger Telegram notification
-        # from telegram_bot.utils import send_booking_notification
-        # send_booking_notification(booking)
-        
-        # return JsonResponse({'success': True, 'booking_id': booking.id})
+
+
+# Longest range the availability endpoint answers in one request
+MAX_AVAILABILITY_DAYS = 31
+
+@require_GET
+def availability(request, business_slug):
+    """
+    Free start times for a service as JSON
+    
+    Query: ?service=<item id>&start=YYYY-MM-DD&days=7
+    
+    Responses are cached per business and invalidated by booking writes
+    (the 'bookings' version) and item changes (the 'site' version).
+    """
+    business = get_business_or_404(business_slug)
+    
+    try:
+        service_id = int(request.GET['service'])
+        today = timezone.localdate()
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else today
+        days = min(max(int(request.GET.get('days', 7)), 1), MAX_AVAILABILITY_DAYS)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    start = max(start, today)
+    end = start + timedelta(days=days - 1)
+    
+    now = timezone.localtime()
+    key = ':'.join(str(part) for part in (
+        'availability', business.pk,
+        get_version('bookings', business), get_version('site', business),
+        service_id, start, days,
+        # Past slots drop out as the day goes on
+        today, slot_index(now.time()),
+    ))
+    data = cache.get(key)
+    if data is None:
+        service = BusinessItem.objects.filter(
+            business=business, pk=service_id, item_type='service', is_active=True,
+        ).values('duration_minutes').first()
+        if service is None:
+            return JsonResponse({'error': 'Unknown service'}, status=404)
         
-        return JsonResponse({'success': True, 'booking_id': booking.id})
+        slots = free_slots(business, service['duration_minutes'], start, end, now=now)
+        data = {
+            'service': service_id,
+            'slot_minutes': settings.BOOKING_SLOT_MINUTES,
+            'days': {
+                day.isoformat(): [t.strftime('%H:%M') for t in times]
+                for day, times in slots.items()
+            },
+        }
+        cache.set(key, data, settings.AVAILABILITY_CACHE_TIMEOUT)
     
-    return JsonResponse({'error': 'Invalid request'})
-
+    return JsonResponse(data)
 
 
 # def public_business_view(request, slug):
@@ -96,4 +294,4 @@ def create_booking(request, business_slug):
 #     # For now, just show a simple page
 #     return render(request, 'businesses/public.html', {
 #         'business': business
-#     })
\ No newline at end of file
+#     })
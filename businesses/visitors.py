@@ -0,0 +1,86 @@
+# businesses/visitors.py
+"""
+Unique visitor counting with per-day HyperLogLog sketches
+
+Visits are merged into the business's VisitorSketch for their day in
+batches, never one event at a time: by the buffered ingest flush and by
+each rollup_events chunk. Each batch rewrites a sketch once per business
+and day, and DailyStatistics.unique_visitors is refreshed from it. Adding
+a visitor twice changes nothing, so both paths may see the same visit.
+Weekly/monthly uniques merge the daily sketches instead of scanning
+AnalyticsEvent.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from businesses.hll import HyperLogLog
+
+
+def visitor_key(session_id='', ip_address=None, agent_id=None):
+    """Identify a visitor by session, falling back to IP + user agent"""
+    if session_id:
+        return f"s:{session_id}"
+    if ip_address:
+        return f"a:{ip_address}|{agent_id or ''}"
+    return None
+
+
+def record_visits(visits):
+    """
+    Merge (business_id, date, visitor key) triples into the daily
+    sketches, one sketch write per business and day
+    """
+    keys = defaultdict(set)
+    for business_id, date, key in visits:
+        keys[(business_id, date)].add(key)
+    for (business_id, date), day_keys in keys.items():
+        record_visitors(business_id, date, day_keys)
+
+
+def record_visitors(business, date, keys):
+    """Add visitor keys to the day's sketch and refresh unique_visitors"""
+    from businesses.counters import assign
+    from businesses.models import VisitorSketch
+
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+
+    business_id = getattr(business, 'pk', business)
+
+    with transaction.atomic():
+        sketch_row, created = VisitorSketch.objects.select_for_update().get_or_create(
+            business_id=business_id, date=date
+        )
+        sketch = sketch_row.sketch()
+
+        changed = False
+        for key in keys:
+            changed = sketch.add(key) or changed
+
+        if not changed and not created:
+            return
+
+        sketch_row.registers = sketch.to_bytes()
+        sketch_row.save(update_fields=['registers', 'updated_at'])
+        assign(business_id, date, 'unique_visitors', sketch.count())
+
+
+def merged_sketch(business, start_date, end_date):
+    """Merge the daily sketches between two dates (inclusive)"""
+    from businesses.models import VisitorSketch
+
+    merged = HyperLogLog()
+    registers = VisitorSketch.objects.filter(
+        business=business, date__gte=start_date, date__lte=end_date
+    ).values_list('registers', flat=True)
+
+    for data in registers:
+        merged.merge(HyperLogLog.from_bytes(bytes(data)))
+    return merged
+
+
+def unique_visitors(business, start_date, end_date):
+    """Estimated unique visitors between two dates (inclusive)"""
+    return merged_sketch(business, start_date, end_date).count()
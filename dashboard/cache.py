@@ -0,0 +1,72 @@
+# dashboard/cache.py
+"""
+Per-business dashboard context cache
+
+Entries are keyed by the business's 'dashboard' version stamp (see
+businesses.versioning), which item saves, bookings and stats writes bump,
+so a dashboard load is one cache hit until something changes.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from businesses.versioning import get_version
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = 'dashboard:cache:hits'
+MISSES_KEY = 'dashboard:cache:misses'
+
+
+def get_dashboard_context(business, build):
+    """
+    Return the cached dashboard context for `business`, calling
+    `build(business)` to compute it on a miss
+
+    Returns:
+        (context, hit)
+    """
+    version = get_version('dashboard', business)
+    # Period stats roll over at midnight without any write
+    key = f"dashboard:context:{business.pk}:{version}:{timezone.now().date()}"
+
+    context = cache.get(key)
+    if context is not None:
+        _count(HITS_KEY)
+        return context, True
+
+    _count(MISSES_KEY)
+    context = build(business)
+    cache.set(key, context, settings.DASHBOARD_CACHE_TIMEOUT)
+    return context, False
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cache_stats():
+    """
+    Hit/miss counters of the dashboard cache since they were last reset
+
+    Usage:
+        python manage.py dashboard_cache_stats
+    """
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else 0,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
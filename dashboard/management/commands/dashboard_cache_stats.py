@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.cache import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the dashboard context cache hit rate. The counters live in the "
+        "shared cache, so they cover every worker unless CACHE_BACKEND is per-process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help="Zero the counters after printing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {stats['hit_rate']:.1%}"
+        )
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset"))
@@ -1,3 +1,110 @@
+import io
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from businesses.counters import incr
+from businesses.models import Business, BusinessItem
+from businesses.versioning import bump_version
+from dashboard.cache import cache_stats, get_dashboard_context
+
+
+class CatalogImportViewTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.business = Business.objects.create(
+            owner=owner, name='Shop', business_type='shop', phone='+380000000000',
+        )
+        self.client.force_login(owner)
+
+    def test_spreadsheet_booleans_are_accepted(self):
+        # As Excel saves a CSV
+        upload = SimpleUploadedFile(
+            'catalog.csv', b'sku,name,price,is_available\r\nA1,Tea,50,TRUE\r\nA2,Cake,80,FALSE\r\n',
+        )
+
+        response = self.client.post('/dashboard/catalog/import/', {'file': upload})
+
+        self.assertEqual(response.json(), {'created': 2, 'updated': 0, 'failed': 0, 'errors': []})
+        self.assertEqual(
+            dict(BusinessItem.objects.values_list('sku', 'is_available')),
+            {'A1': True, 'A2': False},
+        )
+        self.assertEqual(
+            set(BusinessItem.objects.values_list('item_type', flat=True)), {'product'},
+        )
+
+    def test_missing_file(self):
+        response = self.client.post('/dashboard/catalog/import/')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class StatsApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.business = Business.objects.create(
+            owner=owner, name='Shop', business_type='shop', phone='+380000000000',
+        )
+        self.client.force_login(owner)
+        self.url = reverse('dashboard:stats_api')
+
+    def test_unchanged_stats_are_not_resent(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_counter_change_invalidates_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        incr(self.business, timezone.now().date(), 'visits')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('stats', response.json())
+
+
+class DashboardCacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username='owner', password='secret')
+        self.business = Business.objects.create(
+            owner=owner, name='Shop', business_type='shop', phone='+380000000000',
+        )
+
+    def test_hits_and_misses_are_reported(self):
+        build = lambda business: {'name': business.name}
+        get_dashboard_context(self.business, build)
+        get_dashboard_context(self.business, build)
+        bump_version('dashboard', self.business)
+        get_dashboard_context(self.business, build)
+
+        out = io.StringIO()
+        call_command('dashboard_cache_stats', '--reset', stdout=out)
+
+        self.assertIn('Hits: 1  Misses: 2  Hit rate: 33.3%', out.getvalue())
+        self.assertEqual(cache_stats(), {'hits': 0, 'misses': 0, 'hit_rate': 0})
+
+
+class LiveFeedTests(TestCase):
+    def test_feed_is_off_under_wsgi(self):
+        owner = User.objects.create_user(username='owner', password='secret')
+        Business.objects.create(
+            owner=owner, name='Shop', business_type='shop', phone='+380000000000',
+        )
+        self.client.force_login(owner)
+
+        response = self.client.get(reverse('dashboard:live_feed'))
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 204)
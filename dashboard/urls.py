@@ -6,5 +6,10 @@ app_name = 'dashboard'
 urlpatterns = [
     path('setup/', views.setup_business, name='setup_business'),
     path('', views.dashboard_view, name='dashboard'),
+    path('api/heatmap/', views.heatmap_api, name='heatmap_api'),
+    path('api/stats/', views.stats_api, name='stats_api'),
+    path('live/', views.live_feed, name='live_feed'),
+    path('catalog/import/', views.catalog_import, name='catalog_import'),
+    path('catalog/export/', views.catalog_export, name='catalog_export'),
     
 ]
\ No newline at end of file
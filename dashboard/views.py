@@ -1,10 +1,24 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET, require_POST
 from businesses.models import Business, BusinessItem, Statistics
+from .cache import get_dashboard_context
+from businesses import catalog
+from businesses.pubsub import channel_name, get_broker
+from businesses.versioning import get_version
 from businesses.utils import (
-    calculate_comparison_stats,
-    calculate_period_stats
+    calculate_appointment_stats,
+    calculate_dashboard_stats,
+    calculate_hourly_heatmap,
+    calculate_total_stats,
 )
 @login_required
 def setup_business(request):
@@ -51,17 +65,32 @@ def dashboard_view(request):
     
     business = get_object_or_404(Business, owner=request.user)
     
-    # Get or create statistics
-    stats, created = Statistics.objects.get_or_create(business=business)
+    # Everything but the business itself comes from the versioned cache
+    context, hit = get_dashboard_context(business, build_dashboard_context)
+    context = dict(context, business=business)
+    
+    response = render(request, 'dashboard/dashboard.html', context)
+    response['X-Dashboard-Cache'] = 'hit' if hit else 'miss'
+    return response
 
-     # Get comparison stats for the week
-    comparison_stats = calculate_comparison_stats(business, days=7)
 
-    # Get today's stats
-    today_stats = calculate_period_stats(business, days=1)
+def build_dashboard_context(business):
+    """Compute the dashboard context (without the business) from the database"""
+    
+    # Get or create statistics
+    stats, created = Statistics.objects.get_or_create(business=business)
     
-    # Get week stats
-    week_stats = calculate_period_stats(business, days=7)
+    # All-time totals and the appointment numbers are summed from the daily
+    # rows; the stored totals are only a rebuild_statistics snapshot
+    for field, value in calculate_total_stats(business).items():
+        setattr(stats, field, value)
+    if business.business_type == 'booking':
+        appointments = calculate_appointment_stats(business)
+        stats.appointments_today = appointments['today']
+        stats.appointments_week = appointments['week']
+
+    # Week-over-week comparison, today's and this week's stats in one query
+    comparison_stats, today_stats, week_stats = calculate_dashboard_stats(business, days=7)
     
     # Get navigation based on business type
     navigation = get_navigation_config(business.business_type)
@@ -70,10 +99,10 @@ def dashboard_view(request):
     stats_data = get_stats_config(business.business_type, stats, comparison_stats)
     
     # Get recent items
-    recent_items = BusinessItem.objects.filter(
+    recent_items = list(BusinessItem.objects.filter(
         business=business,
         is_active=True
-    ).order_by('-created_at')[:5]
+    ).order_by('-created_at')[:5])
     
     # Get quick actions
     quick_actions = get_quick_actions(business.business_type)
@@ -84,22 +113,126 @@ def dashboard_view(request):
     # Get main content title
     main_content_title = get_main_content_title(business.business_type)
     
-    context = {
-        'business': business,
+    return {
         'navigation': navigation,
         'stats': stats_data,
         'recent_items': recent_items,
         'quick_actions': quick_actions,
         'primary_action_text': primary_action_text,
         'main_content_title': main_content_title,
-        'comparison_stats': comparison_stats,  # ADD THIS LINE
-        'today_stats': today_stats,            # ADD THIS LINE
-        'week_stats': week_stats,              # ADD THIS LINE
+        'comparison_stats': comparison_stats,
+        'today_stats': today_stats,
+        'week_stats': week_stats,
     }
+
+
+@login_required
+@require_GET
+def stats_api(request):
+    """
+    Dashboard stat cards and comparison stats as JSON, for polling
+
+    The ETag is the business's dashboard version, so an unchanged
+    dashboard is answered with 304 before any stats are read.
+    """
+    business = get_object_or_404(Business, owner=request.user)
+    
+    version = get_version('dashboard', business)
+    etag = f'"{business.pk}-{version}-{timezone.now().date().isoformat()}"'
+    
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        context, hit = get_dashboard_context(business, build_dashboard_context)
+        response = JsonResponse({
+            'stats': context['stats'],
+            'comparison_stats': context['comparison_stats'],
+        })
+    
+    # A 304 repeats the validator too (RFC 9110 15.4.5). Always
+    # revalidate; the ETag makes that cheap
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+async def live_feed(request):
+    """
+    Server-Sent Events stream of the owner's business: new bookings and
+    counter deltas as they are written
+
+    Each open dashboard is one idle coroutine waiting on its subscription;
+    a comment is sent every LIVE_FEED_HEARTBEAT seconds to keep proxies
+    from closing the connection.
+
+    Only served under ASGI: a WSGI worker would be pinned by every open
+    stream. Elsewhere it answers 204, which tells EventSource not to
+    reconnect, and the dashboard keeps polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    business_id = await Business.objects.filter(owner=user).values_list('id', flat=True).afirst()
+    if business_id is None:
+        raise Http404
     
-    return render(request, 'dashboard/dashboard.html', context)
+    response = StreamingHttpResponse(
+        _feed_events(channel_name(business_id)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _feed_events(channel):
+    subscription = get_broker().subscribe(channel)
+    next_message = None
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            if next_message is None:
+                next_message = asyncio.ensure_future(anext(subscription))
+            done, _ = await asyncio.wait({next_message}, timeout=settings.LIVE_FEED_HEARTBEAT)
+            if not done:
+                yield ': keep-alive\n\n'
+                continue
+            
+            message = next_message.result()
+            next_message = None
+            event = json.loads(message)['event']
+            yield f'event: {event}\ndata: {message}\n\n'
+    finally:
+        # Client went away: drop the subscription
+        if next_message is not None:
+            next_message.cancel()
+            await asyncio.gather(next_message, return_exceptions=True)
+        await subscription.aclose()
 
 
+HEATMAP_EVENT_TYPES = ('visit', 'menu_view', 'qr_scan', 'booking', 'order')
+
+@login_required
+def heatmap_api(request):
+    """Weekday/hour heatmap of the owner's business as JSON"""
+    business = get_object_or_404(Business, owner=request.user)
+    
+    event_type = request.GET.get('event', 'visit')
+    if event_type not in HEATMAP_EVENT_TYPES:
+        return JsonResponse({'error': 'Unknown event type'}, status=400)
+    
+    try:
+        weeks = min(max(int(request.GET.get('weeks', 4)), 1), 52)
+    except ValueError:
+        weeks = 4
+    
+    return JsonResponse({
+        'event_type': event_type,
+        'weeks': weeks,
+        'matrix': calculate_hourly_heatmap(business, weeks=weeks, event_type=event_type),
+    })
+
 
 def get_navigation_config(business_type):
     configs = {
@@ -148,6 +281,7 @@ def get_navigation_config(business_type):
 def get_stats_config(business_type, stats, comparison_stats):
     if business_type == 'menu':
         visits_data = comparison_stats.get('visits', {})
+        uniques_data = comparison_stats.get('unique_visitors', {})
         menu_views_data = comparison_stats.get('menu_views', {})
         qr_scans_data = comparison_stats.get('qr_scans', {})
     
@@ -160,6 +294,14 @@ def get_stats_config(business_type, stats, comparison_stats):
                 'icon': 'fas fa-users',
                 'color': '#3b82f6'
             },
+            {
+                'title': 'Унікальні відвідувачі',
+                'value': uniques_data.get('current', 0),
+                'change': f"{uniques_data.get('change_percent', 0):+.0f}%",
+                'positive': uniques_data.get('is_positive', True),
+                'icon': 'fas fa-user-check',
+                'color': '#8b5cf6'
+            },
             {
                 'title': 'Переглядів меню',
                 'value': menu_views_data.get('current', 0),
@@ -285,4 +427,59 @@ def items_list(request):
 
 @login_required  
 def add_item(request):
-    return render(request, 'add_item.html')
\ No newline at end of file
+    return render(request, 'add_item.html')
+
+
+@login_required
+@require_POST
+def catalog_import(request):
+    """
+    Import an uploaded CSV/XLSX catalog, upserting items by sku
+    
+    Returns the created/updated counts and the rejected rows as JSON.
+    """
+    business = get_object_or_404(Business, owner=request.user)
+    
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'No file uploaded'}, status=400)
+    fmt = 'xlsx' if upload.name.lower().endswith('.xlsx') else 'csv'
+    
+    try:
+        rows = catalog.read_rows(upload, fmt)
+        result = catalog.import_catalog(
+            business, rows,
+            default_item_type=catalog.DEFAULT_ITEM_TYPES.get(business.business_type, 'product'),
+        )
+    except RuntimeError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except (UnicodeDecodeError, ValueError) as e:
+        return JsonResponse({'error': f'Could not read the file: {e}'}, status=400)
+    
+    return JsonResponse(result.as_dict())
+
+
+@login_required
+@require_GET
+def catalog_export(request):
+    """Download the catalog as CSV (streamed) or XLSX"""
+    business = get_object_or_404(Business, owner=request.user)
+    
+    fmt = request.GET.get('format', 'csv')
+    filename = f'{business.slug}-catalog.{fmt}'
+    
+    if fmt == 'xlsx':
+        try:
+            output = catalog.write_catalog_xlsx(business)
+        except RuntimeError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return FileResponse(output, as_attachment=True, filename=filename)
+    if fmt != 'csv':
+        return JsonResponse({'error': 'Unknown format'}, status=400)
+    
+    response = StreamingHttpResponse(
+        catalog.iter_catalog_csv(business),
+        content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+from datetime import time
 from pathlib import Path
 from decouple import config
 
@@ -100,6 +101,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Writers queue up for the lock at BEGIN (waiting up to `timeout`
+            # seconds) instead of failing with "database is locked" when two
+            # transactions that have both read try to write
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # The in-memory test database fails lock conflicts at once, without
+        # waiting; a file lets the concurrency tests queue like production
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -142,6 +155,95 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+STATIC_ROOT = config('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))
+
+# collectstatic fingerprints, minifies and precompresses (see quickbiz_app/storage.py);
+# with DEBUG on, {% static %} serves the unhashed source files
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': config(
+            'STATICFILES_BACKEND',
+            default='quickbiz_app.storage.CompressedManifestStaticFilesStorage',
+        ),
+    },
+}
+
+# Uploaded files (logos, covers, item images and their variants)
+
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
+# Cache
+# Use a shared backend (Redis/Memcached) in production so version stamps
+# and cached pages are coherent across workers
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='quickbiz'),
+    }
+}
+
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=600, cast=int)
+SITE_CACHE_TIMEOUT = config('SITE_CACHE_TIMEOUT', default=3600, cast=int)
+BUSINESS_RESOLVER_TIMEOUT = 3600
+BUSINESS_RESOLVER_NEGATIVE_TIMEOUT = 60  # unknown slugs
+
+# Booking availability
+# Working hours are the same for every booking business for now
+
+BOOKING_DAY_START = time(9, 0)
+BOOKING_DAY_END = time(18, 0)
+BOOKING_SLOT_MINUTES = 15
+AVAILABILITY_CACHE_TIMEOUT = 300
+
+# How long a booking submission's Idempotency-Key is remembered; a retry
+# within this window gets the original response back
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+
+# Uploaded images
+# Variants are written under content-hash names, so the web server can serve
+# MEDIA_URL/IMAGE_VARIANTS_DIR/ with a far-future Cache-Control
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANTS_DIR = 'variants'
+IMAGE_PROCESSING_ASYNC = config('IMAGE_PROCESSING_ASYNC', default=True, cast=bool)
+IMAGE_PROCESSING_WORKERS = 2
+
+# Live dashboard feed (Server-Sent Events)
+# The in-memory broker only reaches dashboards served by the same process;
+# point this at a shared backend when running several ASGI workers
+
+PUBSUB_BACKEND = config('PUBSUB_BACKEND', default='businesses.pubsub.InMemoryBroker')
+LIVE_FEED_HEARTBEAT = 15  # seconds between keep-alive comments
+
+# Analytics ingestion
+# With ANALYTICS_BUFFERED off, track_event writes synchronously (tests, dev)
+
+ANALYTICS_BUFFERED = config('ANALYTICS_BUFFERED', default=False, cast=bool)
+ANALYTICS_BATCH_SIZE = config('ANALYTICS_BATCH_SIZE', default=500, cast=int)
+ANALYTICS_FLUSH_INTERVAL = config('ANALYTICS_FLUSH_INTERVAL', default=2.0, cast=float)
+
+# Page events from user agents matching any of these (case-insensitive)
+# regexes only bump DailyStatistics.bot_hits instead of being stored
+ANALYTICS_BOT_PATTERNS = [
+    r'bot\b', r'crawl', r'spider', r'slurp', r'preview',
+    r'facebookexternalhit', r'whatsapp', r'curl/', r'wget/',
+    r'python-requests', r'headlesschrome',
+]
+
+# Raw AnalyticsEvent rows older than this are pruned by `manage.py rollup_events`
+ANALYTICS_RETENTION_DAYS = config('ANALYTICS_RETENTION_DAYS', default=90, cast=int)
+
+# Where `rollup_events --archive` writes pruned events (see businesses/archive.py)
+ANALYTICS_ARCHIVE_DIR = config('ANALYTICS_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'events'))
+
+# {business_id: shards} - spread DailyStatistics writes of very hot
+# businesses over several rows per day (see businesses/counters.py)
+DAILY_STATS_HOT_SHARDS = {}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -0,0 +1,91 @@
+import gzip
+import tempfile
+from pathlib import Path
+from unittest import skipIf
+
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase
+
+from .storage import CompressedManifestStaticFilesStorage, MIN_COMPRESS_SIZE, brotli, rjsmin
+
+CSS = """
+/* Layout */
+.card {
+    padding: 16px;
+    margin: 0 auto;
+}
+""" + "".join(f".col-{i} {{ width: {i * 2.5}%; }}\n" for i in range(1, 41))
+
+JS = """
+// Poll the stats
+function pollStats(url) {
+    return fetch(url, { credentials: 'same-origin' });
+}
+""" * 5
+
+
+class CompressedManifestStorageTests(SimpleTestCase):
+    """collectstatic output is fingerprinted, minified and precompressed"""
+
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        target = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(target.cleanup)
+
+        files = {'css/app.css': CSS, 'js/app.js': JS, 'css/tiny.css': '.a { color: red; }'}
+        for name, content in files.items():
+            path = Path(source.name, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+
+        # As collectstatic does: copy the files, then post-process them
+        found = FileSystemStorage(location=source.name)
+        self.storage = CompressedManifestStaticFilesStorage(location=target.name, base_url='/static/')
+        for name in files:
+            with found.open(name) as f:
+                self.storage.save(name, f)
+        processed = list(self.storage.post_process({name: (found, name) for name in files}))
+        self.assertFalse([error for name, hashed, error in processed if isinstance(error, Exception)])
+
+    def read(self, name):
+        with self.storage.open(name) as f:
+            return f.read()
+
+    def test_files_are_fingerprinted(self):
+        hashed = self.storage.stored_name('css/app.css')
+
+        self.assertRegex(hashed, r'^css/app\.[0-9a-f]{12}\.css$')
+        self.assertTrue(self.storage.exists(hashed))
+        self.assertEqual(self.storage.url('css/app.css'), f'/static/{hashed}')
+
+    def test_hashed_css_is_minified(self):
+        css = self.read(self.storage.stored_name('css/app.css')).decode()
+
+        self.assertNotIn('/* Layout */', css)
+        self.assertIn('.card{padding:', css)
+
+    @skipIf(rjsmin is None, "rjsmin is not installed")
+    def test_hashed_js_is_minified(self):
+        js = self.read(self.storage.stored_name('js/app.js')).decode()
+
+        self.assertNotIn('// Poll the stats', js)
+        self.assertLess(len(js), len(JS))
+
+    def test_text_assets_get_gzip_siblings(self):
+        hashed = self.storage.stored_name('css/app.css')
+
+        self.assertEqual(gzip.decompress(self.read(f'{hashed}.gz')), self.read(hashed))
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_text_assets_get_brotli_siblings(self):
+        hashed = self.storage.stored_name('js/app.js')
+
+        self.assertEqual(brotli.decompress(self.read(f'{hashed}.br')), self.read(hashed))
+
+    def test_small_files_are_not_compressed(self):
+        hashed = self.storage.stored_name('css/tiny.css')
+
+        self.assertLess(len(self.read(hashed)), MIN_COMPRESS_SIZE)
+        self.assertFalse(self.storage.exists(f'{hashed}.gz'))
+        self.assertFalse(self.storage.exists(f'{hashed}.br'))
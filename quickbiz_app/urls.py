@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from . import views
@@ -27,3 +29,6 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')),  # Google OAuth2
     path('', include('businesses.urls')),
 ]
+
+# Uploaded media is served by the web server in production
+urlpatterns = static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) + urlpatterns
@@ -0,0 +1,107 @@
+// Mobile menu toggle
+function toggleSidebar() {
+    document.getElementById('sidebar').classList.toggle('open');
+}
+
+// Close sidebar when clicking outside on mobile
+document.addEventListener('click', function(e) {
+    const sidebar = document.getElementById('sidebar');
+    const toggle = document.querySelector('.mobile-menu-toggle');
+
+    if (window.innerWidth <= 768 && 
+        !sidebar.contains(e.target) && 
+        !toggle.contains(e.target) && 
+        sidebar.classList.contains('open')) {
+        sidebar.classList.remove('open');
+    }
+});
+
+// Peak hours heatmap (booking businesses)
+const heatmap = document.getElementById('heatmap');
+const heatmapEvent = document.getElementById('heatmap-event');
+const weekdays = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Нд'];
+
+function loadHeatmap() {
+    fetch(heatmap.dataset.url + '?event=' + heatmapEvent.value)
+        .then(response => response.json())
+        .then(data => {
+            const max = Math.max(1, ...data.matrix.flat());
+            let html = '<div></div>';
+            for (let hour = 0; hour < 24; hour++) {
+                html += `<div class="heatmap-label">${hour % 3 === 0 ? hour : ''}</div>`;
+            }
+            data.matrix.forEach((hours, day) => {
+                html += `<div class="heatmap-label">${weekdays[day]}</div>`;
+                hours.forEach((count, hour) => {
+                    const alpha = count ? 0.15 + 0.85 * count / max : 0;
+                    const style = count ? `background: rgba(59, 130, 246, ${alpha.toFixed(2)})` : '';
+                    html += `<div class="heatmap-cell" style="${style}" title="${weekdays[day]} ${hour}:00 — ${count}"></div>`;
+                });
+            });
+            heatmap.innerHTML = html;
+        });
+}
+
+if (heatmap) {
+    heatmapEvent.addEventListener('change', loadHeatmap);
+    loadHeatmap();
+}
+
+// Live stats: the live feed announces new bookings and counter changes,
+// then the cards are refreshed from the stats API (304 if nothing changed).
+// Browsers without EventSource fall back to polling.
+const statsGrid = document.getElementById('stats-grid');
+const STATS_POLL_INTERVAL = 30000;
+const STATS_REFRESH_DELAY = 1000;
+let statsEtag = null;
+let statsRefresh = null;
+
+function renderStats(stats) {
+    const cards = statsGrid.querySelectorAll('.stat-card');
+    stats.forEach((stat, i) => {
+        const card = cards[i];
+        if (!card) return;
+        card.querySelector('.stat-value').textContent = stat.value;
+        const change = card.querySelector('.stat-change');
+        if (change && stat.change) {
+            const arrow = stat.positive ? 'fa-arrow-up' : 'fa-arrow-down';
+            change.className = 'stat-change ' + (stat.positive ? 'positive' : 'negative');
+            change.innerHTML = `<i class="fas ${arrow}"></i> ${stat.change}`;
+        }
+    });
+}
+
+function pollStats() {
+    if (document.hidden) return;
+    const headers = statsEtag ? {'If-None-Match': statsEtag} : {};
+    fetch(statsGrid.dataset.url, {headers: headers, cache: 'no-store'})
+        .then(response => {
+            if (response.status !== 200) return;
+            statsEtag = response.headers.get('ETag');
+            return response.json().then(data => renderStats(data.stats));
+        })
+        .catch(() => {});
+}
+
+function scheduleStatsRefresh() {
+    // Coalesce bursts of events into one request
+    if (statsRefresh) return;
+    statsRefresh = setTimeout(() => {
+        statsRefresh = null;
+        pollStats();
+    }, STATS_REFRESH_DELAY);
+}
+
+if (statsGrid) {
+    if (window.EventSource) {
+        const feed = new EventSource(statsGrid.dataset.liveUrl);
+        ['counters', 'gauges', 'booking'].forEach(event => {
+            feed.addEventListener(event, scheduleStatsRefresh);
+        });
+        // Events published while the stream was down are lost
+        feed.onerror = scheduleStatsRefresh;
+    }
+    // Backstop: the feed may be off (WSGI) or miss events from other workers
+    setInterval(pollStats, STATS_POLL_INTERVAL);
+    document.addEventListener('visibilitychange', pollStats);
+}
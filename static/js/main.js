@@ -1,4 +1,63 @@
 
+        // Analytics beacon for public business pages
+        // Pages opt in with <body data-beacon-url="..."> and report their own
+        // visit, so the server never writes analytics while rendering.
+        (function() {
+            const beaconUrl = document.body && document.body.dataset.beaconUrl;
+            if (!beaconUrl) {
+                return;
+            }
+
+            let pending = [];
+            const seenItems = new Set();
+
+            function sendEvents() {
+                if (!pending.length) {
+                    return;
+                }
+                const body = JSON.stringify({ events: pending });
+                pending = [];
+                if (navigator.sendBeacon) {
+                    navigator.sendBeacon(beaconUrl, new Blob([body], { type: 'application/json' }));
+                } else {
+                    fetch(beaconUrl, { method: 'POST', body: body, keepalive: true });
+                }
+            }
+
+            pending.push({ type: 'visit' });
+            if (new URLSearchParams(window.location.search).get('src') === 'qr') {
+                pending.push({ type: 'qr_scan' });
+            }
+            if (document.body.dataset.businessType === 'menu') {
+                pending.push({ type: 'menu_view' });
+            }
+            sendEvents();
+
+            // Items scrolled into view are batched into one request
+            if ('IntersectionObserver' in window) {
+                const itemObserver = new IntersectionObserver(function(entries) {
+                    entries.forEach(entry => {
+                        const itemId = entry.target.dataset.itemId;
+                        if (entry.isIntersecting && !seenItems.has(itemId)) {
+                            seenItems.add(itemId);
+                            pending.push({ type: 'item_view', item_id: itemId });
+                            itemObserver.unobserve(entry.target);
+                        }
+                    });
+                }, { threshold: 0.5 });
+
+                document.querySelectorAll('[data-item-id]').forEach(item => itemObserver.observe(item));
+            }
+
+            setInterval(sendEvents, 10000);
+            document.addEventListener('visibilitychange', function() {
+                if (document.visibilityState === 'hidden') {
+                    sendEvents();
+                }
+            });
+            window.addEventListener('pagehide', sendEvents);
+        })();
+
         // Mobile menu functionality
         function toggleMobileMenu() {
             const mobileMenu = document.getElementById('mobileMenu');
@@ -27,6 +86,10 @@
             const mobileMenu = document.getElementById('mobileMenu');
             const toggle = document.querySelector('.mobile-menu-toggle');
             
+            if (!mobileMenu || !toggle) {
+                return;
+            }
+            
             if (!mobileMenu.contains(e.target) && !toggle.contains(e.target) && mobileMenu.classList.contains('active')) {
                 closeMobileMenu();
             }
@@ -94,6 +157,9 @@
         // Add scroll effect to navbar
         window.addEventListener('scroll', function() {
             const nav = document.querySelector('nav');
+            if (!nav) {
+                return;
+            }
             if (window.scrollY > 50) {
                 nav.style.background = 'rgba(255, 255, 255, 0.98)';
                 nav.style.boxShadow = '0 2px 20px rgba(0, 0, 0, 0.1)';
@@ -105,7 +171,7 @@
 
         // Handle window resize
         window.addEventListener('resize', function() {
-            if (window.innerWidth > 768) {
+            if (window.innerWidth > 768 && document.getElementById('mobileMenu')) {
                 closeMobileMenu();
             }
         });
@@ -132,7 +198,7 @@
             // If horizontal swipe is greater than vertical and mobile menu is open
             if (Math.abs(diffX) > Math.abs(diffY) && Math.abs(diffX) > 50) {
                 const mobileMenu = document.getElementById('mobileMenu');
-                if (mobileMenu.classList.contains('active') && diffX < 0) {
+                if (mobileMenu && mobileMenu.classList.contains('active') && diffX < 0) {
                     // Swipe right to close menu
                     closeMobileMenu();
                 }
@@ -145,7 +211,7 @@
         // Prevent body scroll when mobile menu is open
         document.addEventListener('touchmove', function(e) {
             const mobileMenu = document.getElementById('mobileMenu');
-            if (mobileMenu.classList.contains('active')) {
+            if (mobileMenu && mobileMenu.classList.contains('active')) {
                 e.preventDefault();
             }
         }, { passive: false });
@@ -180,6 +246,10 @@
         document.addEventListener('keydown', function(e) {
             const mobileMenu = document.getElementById('mobileMenu');
             
+            if (!mobileMenu) {
+                return;
+            }
+
             // Escape key closes mobile menu
             if (e.key === 'Escape' && mobileMenu.classList.contains('active')) {
                 closeMobileMenu();
@@ -221,9 +291,12 @@
         }
 
         // Apply focus trap when mobile menu is open
-        document.querySelector('.mobile-menu-toggle').addEventListener('click', function() {
-            const mobileMenu = document.getElementById('mobileMenu');
-            if (mobileMenu.classList.contains('active')) {
-                trapFocus(mobileMenu);
-            }
-        });
+        const mobileMenuToggle = document.querySelector('.mobile-menu-toggle');
+        if (mobileMenuToggle) {
+            mobileMenuToggle.addEventListener('click', function() {
+                const mobileMenu = document.getElementById('mobileMenu');
+                if (mobileMenu.classList.contains('active')) {
+                    trapFocus(mobileMenu);
+                }
+            });
+        }
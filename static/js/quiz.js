@@ -0,0 +1,267 @@
+let currentStep = 1;
+const totalSteps = 4;
+let selectedBusinessType = '';
+
+// Initialize quiz
+document.addEventListener('DOMContentLoaded', function() {
+    updateProgress();
+    setupEventListeners();
+});
+
+function setupEventListeners() {
+    // Business type selection
+    document.querySelectorAll('.business-type').forEach(type => {
+        type.addEventListener('click', function() {
+            document.querySelectorAll('.business-type').forEach(t => t.classList.remove('selected'));
+            this.classList.add('selected');
+            selectedBusinessType = this.dataset.type;
+            document.getElementById('businessType').value = selectedBusinessType;
+
+            // Enable next button
+            document.getElementById('nextBtn').disabled = false;
+        });
+    });
+
+    // Navigation buttons
+    document.getElementById('nextBtn').addEventListener('click', nextStep);
+    document.getElementById('prevBtn').addEventListener('click', prevStep);
+
+    // Form validation
+    setupFormValidation();
+}
+
+function setupFormValidation() {
+    const requiredFields = ['businessName', 'businessPhone'];
+
+    requiredFields.forEach(fieldId => {
+        const field = document.getElementById(fieldId);
+        if (field) {
+            field.addEventListener('input', validateField);
+            field.addEventListener('blur', validateField);
+        }
+    });
+}
+
+function validateField(event) {
+    const field = event.target;
+    const errorElement = field.parentElement.querySelector('.form-error');
+    let isValid = true;
+    let errorMessage = 'Це поле обов\'язкове';
+
+    // Reset styles
+    field.style.borderColor = '';
+    if (errorElement) errorElement.style.display = 'none';
+
+    // Validate based on field type
+    if (field.hasAttribute('required') && !field.value.trim()) {
+        isValid = false;
+    } else if (field.type === 'tel' && field.value) {
+        const phoneRegex = /^[\+]?[0-9\s\-\(\)]{10,}$/;
+        if (!phoneRegex.test(field.value)) {
+            isValid = false;
+            errorMessage = 'Введіть правильний номер телефону';
+        }
+    } else if (field.type === 'email' && field.value) {
+        const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+        if (!emailRegex.test(field.value)) {
+            isValid = false;
+            errorMessage = 'Введіть правильний email';
+        }
+    }
+
+    if (!isValid) {
+        field.style.borderColor = 'var(--error-color)';
+        if (errorElement) {
+            errorElement.textContent = errorMessage;
+            errorElement.style.display = 'block';
+        }
+    }
+
+    return isValid;
+}
+
+function validateCurrentStep() {
+    const currentStepElement = document.querySelector(`.step[data-step="${currentStep}"]`);
+
+    switch(currentStep) {
+        case 1:
+            return selectedBusinessType !== '';
+        case 2:
+            const businessName = document.getElementById('businessName');
+            return validateField({ target: businessName });
+        case 3:
+            const businessPhone = document.getElementById('businessPhone');
+            const businessEmail = document.getElementById('businessEmail');
+
+            let valid = validateField({ target: businessPhone });
+            if (businessEmail.value) {
+                valid = validateField({ target: businessEmail }) && valid;
+            }
+            return valid;
+        default:
+            return true;
+    }
+}
+
+function nextStep() {
+    if (!validateCurrentStep()) {
+        return;
+    }
+
+    if (currentStep < totalSteps) {
+        // Hide current step
+        document.querySelector(`.step[data-step="${currentStep}"]`).classList.remove('active');
+
+        currentStep++;
+
+        // Show next step
+        document.querySelector(`.step[data-step="${currentStep}"]`).classList.add('active');
+
+        updateProgress();
+        updateNavigation();
+
+        // If final step, submit form
+        if (currentStep === totalSteps) {
+            submitQuiz();
+        }
+    }
+}
+
+function prevStep() {
+    if (currentStep > 1) {
+        // Hide current step
+        document.querySelector(`.step[data-step="${currentStep}"]`).classList.remove('active');
+
+        currentStep--;
+
+        // Show previous step
+        document.querySelector(`.step[data-step="${currentStep}"]`).classList.add('active');
+
+        updateProgress();
+        updateNavigation();
+    }
+}
+
+function updateProgress() {
+    const progress = ((currentStep - 1) / (totalSteps - 1)) * 100;
+    document.getElementById('progressFill').style.width = progress + '%';
+}
+
+function updateNavigation() {
+    const prevBtn = document.getElementById('prevBtn');
+    const nextBtn = document.getElementById('nextBtn');
+
+    // Show/hide previous button
+    if (currentStep > 1 && currentStep < totalSteps) {
+        prevBtn.style.display = 'flex';
+    } else {
+        prevBtn.style.display = 'none';
+    }
+
+    // Update next button
+    if (currentStep === totalSteps) {
+        nextBtn.style.display = 'none';
+    } else if (currentStep === totalSteps - 1) {
+        nextBtn.innerHTML = '<i class="fas fa-check"></i> Завершити';
+    } else {
+        nextBtn.innerHTML = 'Продовжити <i class="fas fa-arrow-right"></i>';
+    }
+
+    // Disable next button on step 1 if no business type selected
+    if (currentStep === 1) {
+        nextBtn.disabled = selectedBusinessType === '';
+    } else {
+        nextBtn.disabled = false;
+    }
+}
+
+async function submitQuiz() {
+    const loadingOverlay = document.getElementById('loadingOverlay');
+    loadingOverlay.classList.add('show');
+
+    // Collect form data
+    const formData = new FormData();
+    formData.append('business_type', selectedBusinessType);
+    formData.append('business_name', document.getElementById('businessName').value);
+    formData.append('business_description', document.getElementById('businessDescription').value);
+    formData.append('business_address', document.getElementById('businessAddress').value);
+    formData.append('business_phone', document.getElementById('businessPhone').value);
+    formData.append('business_email', document.getElementById('businessEmail').value);
+    formData.append('telegram_username', document.getElementById('telegramUsername').value);
+
+    // Add CSRF token
+    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+    formData.append('csrfmiddlewaretoken', csrfToken);
+
+    try {
+        const response = await fetch('/dashboard/setup/', {
+            method: 'POST',
+            body: formData,
+            headers: {
+                'X-CSRFToken': csrfToken
+            }
+        });
+
+        if (response.ok) {
+            const result = await response.json();
+
+            // Simulate processing time for better UX
+            setTimeout(() => {
+                loadingOverlay.classList.remove('show');
+                // Redirect to dashboard
+                window.location.href = '/dashboard/';
+            }, 2000);
+        } else {
+            throw new Error('Network response was not ok');
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        loadingOverlay.classList.remove('show');
+        alert('Виникла помилка. Спробуйте ще раз.');
+
+        // Go back to previous step
+        currentStep--;
+        document.querySelector(`.step[data-step="${currentStep + 1}"]`).classList.remove('active');
+        document.querySelector(`.step[data-step="${currentStep}"]`).classList.add('active');
+        updateProgress();
+        updateNavigation();
+    }
+}
+
+// Phone number formatting
+document.getElementById('businessPhone').addEventListener('input', function(e) {
+    let value = e.target.value.replace(/\D/g, '');
+
+    if (value.startsWith('380')) {
+        value = '+' + value;
+    } else if (value.startsWith('0')) {
+        value = '+38' + value;
+    } else if (value.length > 0 && !value.startsWith('+')) {
+        value = '+380' + value;
+    }
+
+    // Format as +380 XX XXX XX XX
+    if (value.length > 4) {
+        value = value.slice(0, 4) + ' ' + value.slice(4);
+    }
+    if (value.length > 7) {
+        value = value.slice(0, 7) + ' ' + value.slice(7);
+    }
+    if (value.length > 11) {
+        value = value.slice(0, 11) + ' ' + value.slice(11);
+    }
+    if (value.length > 14) {
+        value = value.slice(0, 14) + ' ' + value.slice(14);
+    }
+
+    e.target.value = value.slice(0, 17); // Limit length
+});
+
+// Telegram username formatting
+document.getElementById('telegramUsername').addEventListener('input', function(e) {
+    let value = e.target.value;
+    if (value && !value.startsWith('@')) {
+        value = '@' + value.replace('@', '');
+    }
+    e.target.value = value;
+});